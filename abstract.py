@@ -0,0 +1,83 @@
+import argparse
+import importlib
+import sys
+
+# Extraction backends and the module that implements each one. Modules are only
+# imported for the selected backend, and they load their models on first use.
+BACKENDS = {
+    "openai": "run",
+    "hf-api": "huggingface",
+    "bart": "bart",
+    "t5": "huggingt5bart",
+    "gpt2": "gpt2",
+    "gpt2-problem": "distilGPT",
+    "llama": "llama",
+}
+
+# Synthesis sources: the raw abstracts table or the extracted fields
+SYNTHESIS_SOURCES = {
+    "abstracts": "gpt4turbo",
+    "extractions": "sintesegpt",
+}
+
+# Keyword charts: objectives/problems or methods/results
+KEYWORD_SETS = {
+    "objectives": "sintese",
+    "methods": "sintese_discussao",
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="abstract",
+        description="Process and organize scientific abstracts. "
+                    "Options after the subcommand's own ones are passed to the selected script "
+                    "(e.g. 'abstract extract --backend bart --batched --resume').",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    help_text = "Show this help and the options of the selected script"
+
+    # The subcommands handle --help themselves so the selected script can print its options too
+    extract = subparsers.add_parser("extract", add_help=False,
+                                    help="Extract Objectives/Problem/Data/Methods/Results from abstracts")
+    extract.add_argument("-h", "--help", action="store_true", help=help_text)
+    extract.add_argument("--backend", choices=BACKENDS, help="Model or API used for the extraction")
+
+    synthesize = subparsers.add_parser("synthesize", add_help=False,
+                                       help="Map problems to methods and results with GPT-4-turbo")
+    synthesize.add_argument("-h", "--help", action="store_true", help=help_text)
+    synthesize.add_argument("--source", choices=SYNTHESIS_SOURCES, default="abstracts",
+                            help="Synthesize the raw abstracts or the extracted fields")
+
+    keywords = subparsers.add_parser("keywords", add_help=False,
+                                     help="Plot the most frequent keywords of the synthesis table")
+    keywords.add_argument("-h", "--help", action="store_true", help=help_text)
+    keywords.add_argument("--columns", choices=KEYWORD_SETS, default="objectives",
+                          help="Objectives/problems or methods/results")
+    return parser, subparsers.choices
+
+
+# Function to run the selected script's main() with the remaining arguments
+def main(argv=None):
+    parser, commands = build_parser()
+    args, script_args = parser.parse_known_args(argv)
+    if args.command == "extract":
+        module_name = BACKENDS.get(args.backend)
+        if module_name is None and not args.help:
+            commands["extract"].error("--backend is required")
+    elif args.command == "synthesize":
+        module_name = SYNTHESIS_SOURCES[args.source]
+    else:
+        module_name = KEYWORD_SETS[args.columns]
+
+    if args.help:
+        commands[args.command].print_help()
+        if module_name is None:
+            return
+        print(f"\nOptions of {module_name}.py:")
+        script_args = ["--help"]
+    importlib.import_module(module_name).main(script_args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
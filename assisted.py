@@ -0,0 +1,29 @@
+from precision import load_pretrained
+
+
+# Function to load the draft model of assisted (speculative) decoding: a small model that
+# proposes a few tokens at a time, which the target model then checks in one forward pass.
+# With greedy decoding the target keeps only the tokens it would have generated itself,
+# so the output does not change. Both models must share the tokenizer, since the draft
+# tokens are passed to the target as they are.
+def load_draft_model(model, draft_model_name, device="cpu"):
+    from transformers import AutoModelForCausalLM
+    draft_model = load_pretrained(AutoModelForCausalLM, draft_model_name, device)
+    if draft_model.config.vocab_size != model.config.vocab_size:
+        raise ValueError(f"Draft model {draft_model_name} has a vocabulary of {draft_model.config.vocab_size} tokens, "
+                         f"the target model {model.config.vocab_size}: they must share the tokenizer")
+    return draft_model
+
+
+# Function to get the generate() arguments of a generation, adding the draft model when
+# assisted decoding is on. Only greedy decoding keeps the output unchanged (and the
+# transformers assisted loop only handles one greedy or sampled sequence), so beam search
+# or sampling is refused, whether it is asked for here or comes from the checkpoint's
+# generation config (LLaMA-2 checkpoints ship with do_sample=True).
+def assisted_params(model, generation_params, draft_model=None):
+    if draft_model is None:
+        return generation_params
+    config = model.generation_config
+    if generation_params.get("num_beams", config.num_beams) != 1 or generation_params.get("do_sample", config.do_sample):
+        raise ValueError("Assisted decoding is only used with greedy decoding (num_beams=1, do_sample=False)")
+    return dict(generation_params, assistant_model=draft_model)
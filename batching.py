@@ -0,0 +1,153 @@
+import re
+import time
+from llm_cache import get_cache
+from metrics import get_metrics
+
+# Sentence boundaries used to split texts that do not fit in a batch
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+# Function to group items into length buckets for padded batch generation.
+# Items are sorted by token length and packed greedily so that the padded batch
+# (batch size x longest item) stays under `max_batch_tokens`. Returns lists of
+# original indices; an item longer than the budget gets a batch of its own.
+def length_buckets(lengths, max_batch_tokens, max_batch_size=None):
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    current = []
+    longest = 0
+    for index in order:
+        length = lengths[index]
+        candidate_longest = max(longest, length)
+        too_many_tokens = current and candidate_longest * (len(current) + 1) > max_batch_tokens
+        too_many_items = max_batch_size is not None and len(current) >= max_batch_size
+        if too_many_tokens or too_many_items:
+            batches.append(current)
+            current = []
+            candidate_longest = length
+        current.append(index)
+        longest = candidate_longest
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Function to split an iterable into lists of at most `size` items
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Function to split a text into pieces of at most `max_tokens` tokens, at sentence
+# boundaries where possible (at word boundaries inside overlong sentences)
+def split_text(text, max_tokens, count_tokens):
+    units = []
+    for sentence in _SENTENCE_END.split(text):
+        if count_tokens(sentence) <= max_tokens:
+            units.append(sentence)
+        else:
+            units.extend(sentence.split())
+    pieces = []
+    current = []
+    used = 0
+    for unit in units:
+        tokens = count_tokens(unit)
+        if current and used + tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+            used = 0
+        current.append(unit)
+        used += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+# Function to pack texts greedily, in input order, into batches whose token count (plus
+# one separator token per text) stays under `max_tokens`. Texts longer than the budget
+# are split into pieces instead of overflowing a request. Returns lists of texts.
+def pack_by_tokens(texts, max_tokens, count_tokens):
+    batches = []
+    current = []
+    used = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if tokens + 1 <= max_tokens:
+            pieces = [(text, tokens)]
+        else:
+            pieces = [(piece, count_tokens(piece)) for piece in split_text(text, max_tokens - 1, count_tokens)]
+        for piece, piece_tokens in pieces:
+            if current and used + piece_tokens + 1 > max_tokens:
+                batches.append(current)
+                current = []
+                used = 0
+            current.append(piece)
+            used += piece_tokens + 1
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Function to generate the outputs of several inputs with a seq2seq model, in
+# length-bucketed padded batches. Cached outputs are reused and only the misses are
+# tokenized and generated; `load_model()` is called only then and returns (tokenizer,
+# model, device). Inputs are truncated to `max_length` tokens (the tokenizer's
+# model_max_length by default), as on the single-input path, so both paths produce the
+# same output for the same cache key. Returns one output per input, in order.
+def generate_batched(input_texts, cache_key, load_model, generation_params, max_batch_tokens, max_length=None):
+    cache = get_cache()
+    outputs = [cache.get(cache_key(input_text)) for input_text in input_texts]
+
+    pending = [i for i, output in enumerate(outputs) if output is None]
+    if pending:
+        tokenizer, model, device = load_model()
+        metrics = get_metrics()
+        with metrics.stage("tokenize"):
+            encoded = tokenizer([input_texts[i] for i in pending], truncation=True,
+                                max_length=max_length or tokenizer.model_max_length)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        metrics.count("tokens_in", sum(lengths))
+        for bucket in length_buckets(lengths, max_batch_tokens):
+            batch = tokenizer.pad({"input_ids": [encoded["input_ids"][j] for j in bucket]}, return_tensors="pt").to(device)
+            with metrics.stage("generate"):
+                output_ids = model.generate(batch["input_ids"], attention_mask=batch["attention_mask"], **generation_params)
+            metrics.count("tokens_out", int((output_ids != tokenizer.pad_token_id).sum()))
+            # Write each output back to the position of its input
+            for j, output in zip(bucket, tokenizer.batch_decode(output_ids, skip_special_tokens=True)):
+                outputs[pending[j]] = output
+                cache.put(cache_key(input_texts[pending[j]]), output)
+
+    return outputs
+
+
+# Function to process abstracts in chunks of `chunk_size`, keeping the input order in the
+# output: `summarize(chunk)` returns one summary per abstract (None on error), each one is
+# parsed with `parse` and written with `build_row(parsed_data, latency)`
+def process_batched(abstracts, sink, summarize, parse, build_row, chunk_size=64):
+    metrics = get_metrics()
+    processed = 0
+    start = time.perf_counter()
+    for chunk in chunked(abstracts, chunk_size):
+        print(f"Processing {len(chunk)} abstracts, starting with: {chunk[0][:60]}...")
+        chunk_start = time.perf_counter()
+        summaries = summarize(chunk)
+        # Batched generation has no per-abstract latency: use the chunk average
+        latency = (time.perf_counter() - chunk_start) / len(chunk)
+        for abstract, summary in zip(chunk, summaries):
+            if summary:
+                with metrics.stage("parse"):
+                    parsed_data = parse(summary)
+                sink.write(abstract, build_row(parsed_data, latency))
+            else:
+                print("Skipping abstract due to error.")
+                metrics.count("errors")
+        processed += len(chunk)
+        metrics.item_done(len(chunk))
+        elapsed = time.perf_counter() - start
+        print(f"{processed} abstracts in {elapsed:.1f}s ({processed / elapsed:.2f} abstracts/s)")
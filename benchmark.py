@@ -0,0 +1,249 @@
+import argparse
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from abstract import BACKENDS
+from llm_cache import set_cache_enabled
+from loader import load_abstracts
+from mock_server import LatencyModel, MockConfig, start_mock_server
+from precision import PRECISIONS, set_precision
+from rate_limiter import estimate_tokens
+from result_sink import FIELDS
+
+# Generation function of each backend module, called once per abstract
+SUMMARY_FUNCTIONS = {
+    "run": "get_abstract_summary",
+    "huggingface": "get_structured_summary",
+    "bart": "get_bart_summary",
+    "huggingt5bart": "get_structured_summary",
+    "gpt2": "get_structured_summary",
+    "distilGPT": "get_problem_summary",
+    "llama": "get_problem_summary",
+}
+# Backends that call a remote API (benchmarked against the local mock server unless --live)
+REMOTE_BACKENDS = {"openai", "hf-api"}
+# Packages needed by the remote backends (the local ones need torch and transformers)
+REQUIRED_PACKAGES = {"openai": ["openai"], "hf-api": ["requests"]}
+# Backends that only extract the problem
+PROBLEM_BACKENDS = {"gpt2-problem", "llama"}
+# Backends with an assisted-decoding mode (a DRAFT_MODEL that proposes the tokens)
+DRAFT_BACKENDS = {"gpt2", "gpt2-problem", "llama"}
+
+
+# Function to pick a reproducible sample of abstracts: the same seed gives the same sample
+def sample_abstracts(file_path, size, seed=0):
+    abstracts = list(load_abstracts(file_path))
+    if size >= len(abstracts):
+        return abstracts
+    return random.Random(seed).sample(abstracts, size)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# Function to tell why a backend cannot run here (a missing package), or None if it can
+def unavailable_reason(backend):
+    required = REQUIRED_PACKAGES.get(backend, ["torch", "transformers"])
+    missing = [name for name in required if importlib.util.find_spec(name) is None]
+    return f"not installed: {', '.join(missing)}" if missing else None
+
+
+# Function to count the generated tokens of one output. The causal LMs echo their prompt,
+# which is removed first; the backend's tokenizer is used when it has one.
+def generated_tokens(module, abstract_text, output):
+    header = getattr(module, "PROMPT_HEADER", None)
+    if header is not None:
+        prompt = f"{header} {abstract_text}"
+        if output.startswith(prompt):
+            output = output[len(prompt):]
+    tokenizer = getattr(module, "tokenizer", None)
+    if tokenizer is not None:
+        return len(tokenizer(output, add_special_tokens=False)["input_ids"])
+    return estimate_tokens(output)
+
+
+# Function to benchmark one backend in the current process (see run_backend), optionally
+# with assisted decoding by its draft model
+def benchmark_backend(backend, abstracts, draft=False):
+    module = importlib.import_module(BACKENDS[backend])
+    if draft:
+        module.draft_model_name = module.DRAFT_MODEL
+    summarize = getattr(module, SUMMARY_FUNCTIONS[module.__name__])
+    fields = ["Problem"] if backend in PROBLEM_BACKENDS else FIELDS
+    parse = getattr(module, "parse_structured_summary", None) or getattr(module, "parse_analysis", None)
+
+    load_time = 0.0
+    if hasattr(module, "load_model"):
+        start = time.perf_counter()
+        module.load_model()
+        load_time = time.perf_counter() - start
+
+    latencies = []
+    tokens = 0
+    parsed = 0
+    errors = 0
+    # Digest of the outputs, to check that assisted decoding generates the same text
+    digest = hashlib.sha256()
+    run_start = time.perf_counter()
+    for abstract in abstracts:
+        start = time.perf_counter()
+        output = summarize(abstract)
+        latencies.append(time.perf_counter() - start)
+        digest.update(f"{output}\0".encode("utf-8"))
+        if not output:
+            errors += 1
+            continue
+        tokens += generated_tokens(module, abstract, output)
+        row = module.build_row(parse(output) if parse else output, 0.0)
+        if all(row.get(field) not in (None, "", "N/A") for field in fields):
+            parsed += 1
+    elapsed = time.perf_counter() - run_start
+
+    return {
+        "module": module.__name__,
+        "model": getattr(module, "model_name", None) or getattr(module, "MODEL_NAME", None),
+        "draft_model": getattr(module, "draft_model_name", None),
+        "abstracts": len(abstracts),
+        "errors": errors,
+        "load_time_s": round(load_time, 3),
+        "latency_p50_s": round(percentile(latencies, 50), 4),
+        "latency_p95_s": round(percentile(latencies, 95), 4),
+        "abstracts_per_s": round(len(abstracts) / elapsed, 3),
+        "generated_tokens_per_s": round(tokens / elapsed, 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "parse_success_rate": round(parsed / len(abstracts), 3),
+        "output_sha256": digest.hexdigest(),
+    }
+
+
+# Function to benchmark one backend in a fresh process, so that load time and peak RSS
+# are not affected by the backends measured before it
+def run_backend(backend, args, env, draft=False):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as file:
+        result_file = file.name
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", backend, "--result-file", result_file,
+                   "--input", args.input, "--sample", str(args.sample), "--seed", str(args.seed),
+                   "--precision", args.precision] + (["--draft"] if draft else [])
+        completed = subprocess.run(command, env=env, stdout=subprocess.DEVNULL if args.quiet else None)
+        if completed.returncode != 0:
+            return {"error": f"benchmark process exited with status {completed.returncode}"}
+        with open(result_file) as file:
+            return json.load(file)
+    finally:
+        os.remove(result_file)
+
+
+# Function to add to an assisted-decoding result its speedup over the plain run of the
+# same backend (ratio of the median latencies) and whether both generated the same text
+def compare_draft(baseline, result):
+    if "latency_p50_s" in baseline and "latency_p50_s" in result:
+        result["speedup_p50"] = round(baseline["latency_p50_s"] / result["latency_p50_s"], 2)
+        result["same_output"] = baseline["output_sha256"] == result["output_sha256"]
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extraction backends on a fixed, seeded sample of abstracts.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS),
+                        help="Backends to benchmark (default: all that can run here)")
+    parser.add_argument("--input", default="abstracts_list.txt", help="Abstracts file, one abstract per line")
+    parser.add_argument("--sample", type=int, default=20, help="Number of abstracts in the sample")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the sample")
+    parser.add_argument("--precision", choices=PRECISIONS, default="auto", help="Precision of the local models")
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="Response delay of the mock API server, in seconds")
+    parser.add_argument("--live", action="store_true", help="Call the real OpenAI/Hugging Face APIs instead of the mock server")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file with the results")
+    parser.add_argument("--draft", action="store_true",
+                        help="Also benchmark the causal LMs (gpt2, gpt2-problem, llama) with assisted decoding by their "
+                             "draft model, reporting the latency speedup and whether the output is unchanged")
+    parser.add_argument("--quiet", action="store_true", help="Hide the output of the backends")
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    abstracts = sample_abstracts(args.input, args.sample, args.seed)
+
+    # Worker process: measure a single backend and hand the result back through a file
+    if args.worker:
+        # Every call must do the real work, so the response cache is bypassed
+        set_cache_enabled(False)
+        set_precision(args.precision)
+        result = benchmark_backend(args.worker, abstracts, args.draft)
+        with open(args.result_file, "w") as file:
+            json.dump(result, file)
+        return
+
+    env = dict(os.environ)
+    server = None
+    if not args.live and REMOTE_BACKENDS & set(args.backends):
+        server, base_url = start_mock_server(config=MockConfig(latency=LatencyModel(mean=args.mock_latency)))
+        env.update(OPENAI_BASE_URL=f"{base_url}/v1", OPENAI_API_KEY="mock", HF_API_BASE_URL=base_url, HF_API_TOKEN="mock")
+        print(f"Remote backends run against the mock server at {base_url}")
+
+    results = {}
+    try:
+        for backend in args.backends:
+            reason = unavailable_reason(backend)
+            if reason:
+                print(f"Skipping {backend}: {reason}")
+                results[backend] = {"skipped": reason}
+                continue
+            print(f"Benchmarking {backend} on {len(abstracts)} abstracts...")
+            results[backend] = run_backend(backend, args, env)
+            print(json.dumps(results[backend]))
+            if args.draft and backend in DRAFT_BACKENDS:
+                print(f"Benchmarking {backend} with assisted decoding...")
+                results[f"{backend}+draft"] = compare_draft(results[backend], run_backend(backend, args, env, draft=True))
+                print(json.dumps(results[f"{backend}+draft"]))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "input": args.input,
+        "sample": len(abstracts),
+        "seed": args.seed,
+        "precision": args.precision,
+        "draft": args.draft,
+        "remote": "live" if args.live else "mock",
+        "backends": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import re
+import zlib
+import numpy as np
+from metrics import get_metrics
+
+# Jaccard similarity (of word shingles) above which two abstracts count as the same paper
+DEFAULT_THRESHOLD = 0.8
+# Number of hash functions in a MinHash signature
+NUM_PERM = 128
+# Words per shingle
+SHINGLE_SIZE = 5
+# Odd multiplier of the rolling hash that combines the word hashes of a shingle
+_SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_WORD = re.compile(r"\w+")
+
+
+# Function to hash the word k-shingles of a text, ignoring case and punctuation. Each
+# word is hashed once (CRC32, stable across runs unlike hash()) and the shingles are
+# rolled from the word hashes with 64-bit arithmetic. A text with no words has no shingles.
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    count = max(len(words) - size + 1, 1)
+    shingles = np.zeros(count, dtype=np.uint64)
+    for offset in range(min(size, len(words))):
+        shingles = shingles * _SHINGLE_MULTIPLIER + word_hashes[offset:offset + count]
+    return shingles
+
+
+# Function to pick the LSH banding (bands, rows per band) of a signature: the highest
+# S-curve threshold (1/bands)^(1/rows) that is not above the Jaccard threshold, so that
+# near-duplicates almost always share a bucket. Candidates are then verified.
+def lsh_bands(num_perm, threshold):
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    return max(below or options[-1:], key=lambda option: (1 / option[0]) ** (1 / option[1]))
+
+
+# MinHash/LSH index of near-duplicate abstracts. Each abstract is compared with the
+# representatives that share at least one LSH band with it, so the work per abstract
+# does not grow with the corpus. An abstract whose estimated Jaccard similarity with a
+# representative reaches the threshold joins that representative's cluster; otherwise it
+# becomes a new representative. A text without words (empty or only punctuation) has no
+# signature, so it is never indexed nor matched and always stays a representative.
+class NearDuplicateIndex:
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        # Multiply-shift hash functions h(x) = (a*x + b) >> 32 in wrapping 64-bit
+        # arithmetic, with odd `a`: no modulo, so the signature is one vectorized pass
+        generator = np.random.default_rng(seed)
+        self._a = generator.integers(0, 2**64, size=num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+        self._b = generator.integers(0, 2**64, size=num_perm, dtype=np.uint64, endpoint=False)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = []
+        self.representatives = []
+
+    # MinHash signature of a text, or None if it has no shingles
+    def signature(self, text):
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not len(hashes):
+            return None
+        # One row per hash function, one column per shingle
+        values = (np.outer(self._a, hashes) + self._b[:, None]) >> np.uint64(32)
+        return values.min(axis=1)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    # Add an abstract; returns the index of its cluster's representative (its own index
+    # in `representatives` if it starts a new cluster) and whether it is a duplicate
+    def add(self, text):
+        signature = self.signature(text)
+        if signature is None:
+            self.representatives.append(text)
+            self._signatures.append(None)
+            return len(self.representatives) - 1, False
+        keys = self._band_keys(signature)
+        candidates = set()
+        for bucket, key in zip(self._buckets, keys):
+            candidates.update(bucket.get(key, ()))
+        if candidates:
+            candidates = list(candidates)
+            # Estimated Jaccard similarity: the share of equal MinHash values
+            similarities = (np.stack([self._signatures[candidate] for candidate in candidates]) == signature).mean(axis=1)
+            best = int(similarities.argmax())
+            if similarities[best] >= self.threshold:
+                return candidates[best], True
+
+        index = len(self.representatives)
+        self.representatives.append(text)
+        self._signatures.append(signature)
+        for bucket, key in zip(self._buckets, keys):
+            bucket.setdefault(key, []).append(index)
+        return index, False
+
+
+# Function to group near-duplicate abstracts (e.g. the same paper exported from several
+# databases, or a preprint and its published version). Returns the representatives, in
+# input order, and a dict from each representative to its duplicates.
+def find_near_duplicates(abstracts, threshold=DEFAULT_THRESHOLD, **kwargs):
+    index = NearDuplicateIndex(threshold, **kwargs)
+    duplicates = {}
+    count = 0
+    for abstract in abstracts:
+        count += 1
+        position, duplicate = index.add(abstract)
+        if duplicate:
+            duplicates.setdefault(index.representatives[position], []).append(abstract)
+    found = sum(len(members) for members in duplicates.values())
+    print(f"Deduplication: {count} abstracts, {found} near-duplicates in {len(duplicates)} clusters, "
+          f"{len(index.representatives)} to extract")
+    return index.representatives, duplicates
+
+
+# Result sink wrapper that copies the row of each representative to its near-duplicates,
+# which are never sent for extraction. The copies have no latency of their own.
+class DuplicateFanOut:
+    def __init__(self, sink, duplicates):
+        self.sink = sink
+        self.duplicates = duplicates
+
+    def write(self, abstract_text, row):
+        self.sink.write(abstract_text, row)
+        members = self.duplicates.get(abstract_text, ())
+        for member in members:
+            self.sink.write(member, dict(row, latency_s=0.0))
+        if members:
+            get_metrics().count("duplicates", len(members))
+            get_metrics().item_done(len(members))
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
@@ -1,119 +1,192 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-import csv
+import argparse
+import time
+from assisted import assisted_params, load_draft_model
+from llm_cache import get_cache
+from loader import count_abstracts, load_abstracts, parse_shard
+from metrics import add_metrics_arguments, configure_metrics, get_metrics
+from parallel import process_abstracts_parallel
+from precision import PRECISIONS, load_pretrained, resolve_precision, set_precision
+from prefix_cache import PrefixCache
+from result_sink import open_sink
+from section_parser import parse_sections
+from stopping import SectionStoppingCriteria
 
-# Usar GPT-2 padrão com precisão de 16 bits para otimizar a memória
 model_name = "gpt2"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float16)
-
-# Definir explicitamente o token de preenchimento (pad_token)
-tokenizer.pad_token = tokenizer.eos_token
-
-# Move the model to the CPU, usando precisão de 16 bits
+tokenizer = None
+model = None
+# O modelo roda na CPU
 device = "cpu"
-model = model.to(device)
+# Estados de atenção do cabeçalho do prompt, calculados uma vez (modo --prefix-cache)
+use_prefix_cache = False
+prefix_cache = None
+# Modelo de rascunho da decodificação assistida (modo --draft-model): o DistilGPT-2 usa o
+# mesmo tokenizer do GPT-2 e propõe os tokens que o GPT-2 confere de uma vez
+DRAFT_MODEL = "distilgpt2"
+draft_model_name = None
+draft_model = None
+# Parar a geração assim que todas as seções tiverem texto, em vez de gerar até max_new_tokens
+early_stop = True
+
+# Carregar o modelo e o tokenizer (uma única vez, no primeiro uso)
+def load_model():
+    global tokenizer, model
+    if model is None:
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Carregar GPT-2 na precisão escolhida (fp16 na CPU é emulado e mais lento que fp32,
+        # então a CPU usa fp32, bf16 nativo ou int8 dinâmico)
+        model = load_pretrained(AutoModelForCausalLM, model_name, device)
+
+        # Definir explicitamente o token de preenchimento (pad_token)
+        tokenizer.pad_token = tokenizer.eos_token
+    # Carregar também o modelo de rascunho, se a decodificação assistida estiver ativa
+    global draft_model
+    if draft_model_name and draft_model is None:
+        draft_model = load_draft_model(model, draft_model_name, device)
+    return tokenizer, model
+
+# Prompt detalhado para extrair todos os elementos; o cabeçalho é igual para todos os abstracts
+PROMPT_HEADER = (
+    "Summarize the following abstract into the following sections:\n"
+    "1. Objectives: What was the main purpose or goal of this study?\n"
+    "2. Problem: What problem or challenge was addressed in this study?\n"
+    "3. Data: What data was used in the study?\n"
+    "4. Methods_Techniques: What methods or techniques were applied?\n"
+    "5. Results: What were the main findings or results of the study?\n\n"
+    "Abstract:"
+)
+
+# Calcular os estados de atenção do cabeçalho do prompt (uma única vez)
+def get_prefix_cache():
+    global prefix_cache
+    if prefix_cache is None:
+        load_model()
+        prefix_cache = PrefixCache(model, tokenizer, PROMPT_HEADER, device)
+    return prefix_cache
 
 # Function to extract structured summary from the abstract
 def get_structured_summary(abstract_text):
-    # Prompt detalhado para extrair todos os elementos
-    prompt = (
-        f"Summarize the following abstract into the following sections:\n"
-        f"1. Objectives: What was the main purpose or goal of this study?\n"
-        f"2. Problem: What problem or challenge was addressed in this study?\n"
-        f"3. Data: What data was used in the study?\n"
-        f"4. Methods_Techniques: What methods or techniques were applied?\n"
-        f"5. Results: What were the main findings or results of the study?\n\n"
-        f"Abstract: {abstract_text}"
-    )
+    prompt = f"{PROMPT_HEADER} {abstract_text}"
     
-    # Tokenize input com atenção ao preenchimento e truncamento
-    inputs = tokenizer(prompt, return_tensors="pt", padding=True, truncation=True).to(device)
-
-    # Gerar resumo usando um número maior de tokens para evitar cortes abruptos
-    summary_ids = model.generate(
-        inputs["input_ids"], 
-        attention_mask=inputs["attention_mask"], 
-        max_new_tokens=150,  # Aumentar tokens para capturar tudo
-        num_beams=1,
-        pad_token_id=tokenizer.pad_token_id
-    )
-    summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-    
-    return summary
-
-# Função para salvar os dados estruturados no CSV
-def append_to_csv(data, output_filename="structured_summaries.csv"):
-    with open(output_filename, mode='a', newline='') as file:  # 'a' para modo de append
-        writer = csv.writer(file)
-        writer.writerow([data.get('Objectives', 'N/A'), data.get('Problem', 'N/A'), data.get('Data', 'N/A'),
-                         data.get('Methods_Techniques', 'N/A'), data.get('Results', 'N/A')])
-
-# Função para processar o resumo estruturado
+    generation_params = {"max_new_tokens": 150, "num_beams": 1}  # Aumentar tokens para capturar tudo
+
+    def generate_summary():
+        load_model()
+        metrics = get_metrics()
+        # Tokenize input com atenção ao preenchimento e truncamento
+        with metrics.stage("tokenize"):
+            inputs = tokenizer(prompt, return_tensors="pt", padding=True, truncation=True).to(device)
+
+        # Gerar resumo usando um número maior de tokens para evitar cortes abruptos
+        # (no modo --prefix-cache, partindo dos estados já calculados do cabeçalho)
+        # (no modo --draft-model, com o modelo de rascunho propondo os tokens)
+        # Critério de parada pelo texto gerado (o prompt repetido fica de fora)
+        stopping_criteria = [SectionStoppingCriteria(tokenizer, inputs["input_ids"].shape[1])] if early_stop else None
+        generate = get_prefix_cache().generate if use_prefix_cache else model.generate
+        with metrics.stage("generate"):
+            summary_ids = generate(
+                inputs["input_ids"], 
+                attention_mask=inputs["attention_mask"], 
+                pad_token_id=tokenizer.pad_token_id,
+                stopping_criteria=stopping_criteria,
+                **assisted_params(model, generation_params, draft_model)
+            )
+        metrics.count("tokens_in", inputs["input_ids"].shape[1])
+        metrics.count("tokens_out", summary_ids.shape[1] - inputs["input_ids"].shape[1])
+        return tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+
+    # Resultados já gerados para o mesmo prompt e parâmetros vêm do cache local
+    # A precisão pode mudar o texto gerado, então faz parte da chave do cache
+    # A decodificação assistida não muda o texto (decodificação gulosa), então não faz parte dela
+    # A parada antecipada encurta o texto, então também faz parte da chave
+    cache_params = dict(generation_params, precision=resolve_precision(device))
+    if early_stop:
+        cache_params["stop"] = "sections"
+    return get_cache().cached("local", model_name, prompt, cache_params, generate_summary)
+
+# Função para montar a linha de saída de um abstract, com a origem da chamada
+def build_row(data, latency):
+    return dict(data, backend="transformers", model=model_name, latency_s=round(latency, 3))
+
+# Função para processar o resumo estruturado (veja section_parser.py)
 def parse_structured_summary(summary_text):
-    # Inicializa um dicionário vazio
-    parsed_data = {
-        "Objectives": "N/A",
-        "Problem": "N/A",
-        "Data": "N/A",
-        "Methods_Techniques": "N/A",
-        "Results": "N/A"
-    }
-
-    # Quebra o texto do resumo em linhas e processa cada seção
-    lines = summary_text.split('\n')
-
-    current_section = None
-    for line in lines:
-        # Verifica se a linha começa com algum rótulo de seção
-        if line.startswith("Objectives:"):
-            current_section = "Objectives"
-            parsed_data["Objectives"] = line.replace("Objectives:", "").strip()
-        elif line.startswith("Problem:"):
-            current_section = "Problem"
-            parsed_data["Problem"] = line.replace("Problem:", "").strip()
-        elif line.startswith("Data:"):
-            current_section = "Data"
-            parsed_data["Data"] = line.replace("Data:", "").strip()
-        elif line.startswith("Methods_Techniques:"):
-            current_section = "Methods_Techniques"
-            parsed_data["Methods_Techniques"] = line.replace("Methods_Techniques:", "").strip()
-        elif line.startswith("Results:"):
-            current_section = "Results"
-            parsed_data["Results"] = line.replace("Results:", "").strip()
-
-    return parsed_data
+    # O texto gerado repete o prompt: as perguntas do cabeçalho não são seções
+    return parse_sections(summary_text.split(PROMPT_HEADER, 1)[-1])
 
 # Função para processar os abstracts
-def process_abstracts(abstracts, output_filename="structured_summaries.csv"):
+def process_abstracts(abstracts, sink):
+    processed = 0
+    run_start = time.perf_counter()
     for abstract in abstracts:
         print(f"Processing abstract: {abstract[:60]}...")  # Mostrar parte curta do abstract para tracking
+        start = time.perf_counter()
         summary = get_structured_summary(abstract)
+        latency = time.perf_counter() - start
         
         # Verificar se o resumo foi gerado corretamente e processar o texto
         if summary:
-            parsed_data = parse_structured_summary(summary)
-            append_to_csv(parsed_data, output_filename)  # Salvar imediatamente após processamento
+            with get_metrics().stage("parse"):
+                parsed_data = parse_structured_summary(summary)
+            sink.write(abstract, build_row(parsed_data, latency))  # Em buffer; gravado em lotes
         else:
             print("Skipping abstract due to error.")
+            get_metrics().count("errors")
+        processed += 1
+        get_metrics().item_done()
 
-# Carregar abstracts de um arquivo
-def load_abstracts_from_file(file_path):
-    with open(file_path, 'r') as file:
-        return file.readlines()  # Assume que cada linha é um novo abstract
+    if processed:
+        elapsed = time.perf_counter() - run_start
+        print(f"{processed} abstracts in {elapsed:.1f}s ({processed / elapsed:.2f} abstracts/s)")
 
 # Função principal para executar o processo
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extrair seções estruturadas dos abstracts com GPT-2.")
+    parser.add_argument("--precision", choices=PRECISIONS, default="auto",
+                        help="Precisão do modelo: fp32, bf16 (CPUs com bf16 nativo), int8 (quantização dinâmica) ou auto")
+    parser.add_argument("--prefix-cache", action="store_true", help="Calcular o cabeçalho fixo do prompt uma única vez e reutilizar seus estados de atenção")
+    parser.add_argument("--draft-model", nargs="?", const=DRAFT_MODEL,
+                        help="Decodificação assistida (especulativa): um modelo pequeno propõe os tokens e o GPT-2 os confere em uma única passada, sem mudar o texto gerado (padrão: distilgpt2)")
+    parser.add_argument("--no-early-stop", action="store_true", help="Gerar até max_new_tokens em vez de parar assim que as cinco seções tiverem texto")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Modo paralelo na CPU: processos de trabalho, cada um rodando o modelo nos seus próprios núcleos")
+    parser.add_argument("--threads-per-worker", type=int, help="Threads do PyTorch de cada processo (padrão: os núcleos divididos igualmente)")
+    parser.add_argument("--input", default="abstracts_list.txt", help="Arquivo de abstracts, um por linha")
+    parser.add_argument("--output", default="structured_summaries.csv", help="Arquivo de saída; use um nome .parquet para gravar um dataset Parquet em vez de CSV")
+    parser.add_argument("--shard", type=parse_shard, help="Processar apenas a fatia i de N do arquivo (ex.: 0/4), para dividir o trabalho entre processos")
+    parser.add_argument("--resume", action="store_true", help="Retomar uma execução interrompida, pulando os abstracts já processados")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.prefix_cache and args.draft_model:
+        parser.error("--draft-model não pode ser combinado com --prefix-cache: o modelo de rascunho não tem os estados do cabeçalho")
+    metrics = configure_metrics(args, "gpt2")
+    set_precision(args.precision)
+    global use_prefix_cache, draft_model_name, early_stop
+    use_prefix_cache = args.prefix_cache
+    draft_model_name = args.draft_model
+    early_stop = not args.no_early_stop
+
     # Carregar seus abstracts (ajuste o caminho do arquivo conforme necessário)
-    abstracts = load_abstracts_from_file('abstracts_list.txt')
+    abstracts = load_abstracts(args.input, shard=args.shard)
+
+    # Inicializar a saída com cabeçalhos (mantendo as linhas concluídas ao retomar)
+    with open_sink(args.output, resume=args.resume) as sink:
+        # Pular os abstracts já processados em uma execução anterior
+        abstracts = sink.journal.pending(abstracts)
+        metrics.set_total(lambda: count_abstracts(args.input, args.shard, sink.journal))
+
+        # Processar os abstracts e salvar na saída
+        if args.workers > 1:
+            # Um processo por bloco de núcleos; os pesos (e o cabeçalho do prompt) são carregados uma vez e compartilhados via fork
+            process_abstracts_parallel(abstracts, sink, get_structured_summary, build_row, parse_structured_summary,
+                                       args.workers, args.threads_per_worker,
+                                       load=get_prefix_cache if use_prefix_cache else load_model)
+        else:
+            process_abstracts(abstracts, sink)
 
-    # Inicializar o arquivo CSV com cabeçalhos
-    with open('structured_summaries.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Objectives", "Problem", "Data", "Methods_Techniques", "Results"])
+    if prefix_cache is not None:
+        print(prefix_cache.stats())
 
-    # Processar os abstracts e salvar no CSV
-    process_abstracts(abstracts)
+    metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
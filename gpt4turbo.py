@@ -1,14 +1,22 @@
-import openai
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
 from collections import Counter
-import config
-
-# Configurar sua chave API da OpenAI
-openai.api_key = config.OPENAI_KEY
-
-# Função para enviar um prompt à API do OpenAI para analisar e correlacionar problemas, métodos e resultados
-def analyze_problems_methods_results(texts):
+from batching import pack_by_tokens
+from metrics import add_metrics_arguments, configure_metrics
+from rate_limiter import RateLimiter
+from result_sink import read_results
+from synthesis import DEFAULT_FAN_IN, DEFAULT_INPUT_TOKENS, ChatSynthesis
+from topic_clusters import cluster_abstracts
+
+# Modelo, parâmetros e janela de contexto (tokens de entrada + saída) das chamadas
+MODEL_NAME = "gpt-4-turbo"
+PARAMS = {"max_tokens": 3000, "temperature": 0.7}
+CONTEXT_WINDOW = 128000
+
+# Limite de requisições e tokens por minuto, compartilhado pelas chamadas simultâneas (--workers)
+limiter = RateLimiter(requests_per_minute=30, tokens_per_minute=30000)
+
+# Função para montar as mensagens do pedido de análise de um lote de textos
+def build_messages(texts):
     prompt = f"""As an expert in natural language processing, analyze the following scientific abstracts. 
     Your task is to:
     1. Identify the key problems being addressed in the studies.
@@ -17,36 +25,49 @@ def analyze_problems_methods_results(texts):
     Please create a clear mapping that shows which problems are addressed by which methods and what results are reported.
     Here are the texts: \n\n{texts}"""
 
-    response = openai.chat.completions.create(
-        model="gpt-4-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=3000,
-        temperature=0.7
-    )
-
-    # Correção para acessar corretamente o conteúdo da resposta
-    summary_text = response.choices[0].message.content
-    return summary_text
-
-# Função para processar os dados com lotes menores
-def process_with_chatgpt(df, batch_size=5):
-    abstracts = df['abstract'].dropna().tolist()  # Coleta todos os abstracts
-    results = []
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
 
-    # Dividir os abstracts em lotes
-    for i in range(0, len(abstracts), batch_size):
-        batch_texts = "\n".join(abstracts[i:i + batch_size])
-        try:
-            analysis = analyze_problems_methods_results(batch_texts)
-            results.append(analysis)
-        except openai.error.RateLimitError as e:
-            print(f"Rate limit exceeded for batch {i // batch_size + 1}, skipping...")
-            continue  # Ignorar erros de limite de taxa e continuar com o próximo lote
+# Chamadas à API (com limite de taxa e cache de respostas), orçamento de tokens e map-reduce (veja synthesis.py)
+synthesizer = ChatSynthesis(MODEL_NAME, PARAMS, build_messages, limiter, CONTEXT_WINDOW)
 
-    return "\n".join(results)
+# Função para enviar um prompt à API do OpenAI para analisar e correlacionar problemas, métodos e resultados
+def analyze_problems_methods_results(texts):
+    return synthesizer.request(build_messages(texts))
+
+# Função para processar os dados com lotes menores. Com `pack`, os lotes não têm tamanho
+# fixo: os abstracts são empacotados, em ordem, até o orçamento de tokens de entrada
+# (abstracts maiores que o orçamento são divididos em partes). Com `map_reduce`, os lotes
+# são analisados em paralelo e as análises consolidadas em uma só (veja synthesis.py).
+# Com `clusters` (0 para escolher o número automaticamente), os abstracts são agrupados
+# por tópico e cada lote traz um só tópico; com `top_k`, só os `top_k` abstracts mais
+# centrais de cada tópico são enviados (veja topic_clusters.py)
+def process_with_chatgpt(df, batch_size=5, pack=False, max_input_tokens=None, map_reduce=False,
+                         fan_in=DEFAULT_FAN_IN, workers=4, clusters=None, top_k=None):
+    abstracts = df['abstract'].dropna().tolist()  # Coleta todos os abstracts
+
+    # Agrupar os abstracts por tópico; os termos principais do tópico abrem cada lote
+    if clusters is not None:
+        topics = cluster_abstracts(abstracts, clusters or None, top_k)
+        groups = [(f"Topic (key terms): {', '.join(topic['terms'])}\n\n", topic["abstracts"]) for topic in topics]
+        print(f"{len(abstracts)} abstracts em {len(topics)} tópicos, {sum(len(texts) for _, texts in groups)} enviados")
+    else:
+        groups = [("", abstracts)]
+
+    # Dividir os abstracts (de cada tópico) em lotes
+    batches = []
+    for header, texts in groups:
+        if pack:
+            budget = synthesizer.text_token_budget(max_input_tokens) - synthesizer.count_tokens(header)
+            batches += [header + "\n".join(batch) for batch in pack_by_tokens(texts, budget, synthesizer.count_tokens)]
+        else:
+            batches += [header + "\n".join(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    print(f"{len(abstracts)} abstracts em {len(batches)} chamadas à API")
+
+    # Enviar os lotes para o GPT-4, um após o outro ou em map-reduce
+    return synthesizer.run(batches, map_reduce, fan_in, workers)
 
 # Função para exibir a análise de forma organizada
 def display_analysis(analysis_text):
@@ -55,6 +76,7 @@ def display_analysis(analysis_text):
 
 # Função para gerar gráficos com base nos termos mais comuns
 def plot_keywords(counter_data, title):
+    import matplotlib.pyplot as plt
     keywords, counts = zip(*counter_data.most_common(10))
     plt.barh(keywords, counts, color='skyblue')
     plt.title(title)
@@ -80,12 +102,33 @@ def keyword_count_by_section(analysis_text, section):
     section_words = " ".join(section_text).split()
     return Counter(section_words)
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analisar problemas, métodos e resultados dos abstracts com o GPT-4-turbo.")
+    parser.add_argument("--input", default="sintese_estudos.csv", help="Tabela de síntese com a coluna 'abstract' (CSV ou Parquet)")
+    parser.add_argument("--batch-size", type=int, default=5, help="Abstracts por chamada à API (sem --pack)")
+    parser.add_argument("--pack", action="store_true",
+                        help="Empacotar em cada chamada tantos abstracts quantos couberem no orçamento de tokens de entrada")
+    parser.add_argument("--max-input-tokens", type=int,
+                        help=f"Orçamento de tokens de entrada por chamada com --pack (padrão: {DEFAULT_INPUT_TOKENS})")
+    parser.add_argument("--clusters", type=int, nargs="?", const=0, metavar="K",
+                        help="Agrupar os abstracts em K tópicos (TF-IDF + MiniBatch k-means; sem K, escolhido pelo tamanho do corpus) "
+                             "e montar os lotes por tópico")
+    parser.add_argument("--top-k", type=int, help="Com --clusters, enviar só os K abstracts mais centrais de cada tópico")
+    parser.add_argument("--map-reduce", action="store_true",
+                        help="Analisar os lotes em paralelo e consolidar as análises em árvore, em vez de concatená-las")
+    parser.add_argument("--fan-in", type=int, default=DEFAULT_FAN_IN, help="Análises consolidadas por chamada com --map-reduce")
+    parser.add_argument("--workers", type=int, default=4, help="Chamadas simultâneas à API com --map-reduce")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = configure_metrics(args, "gpt4turbo")
+
     # Carregar os dados
-    df = pd.read_csv('sintese_estudos.csv')
+    df = read_results(args.input, columns=['abstract'])
 
     # Processar os abstracts com ChatGPT para obter a análise de problemas, métodos e resultados
-    analysis_text = process_with_chatgpt(df)
+    analysis_text = process_with_chatgpt(df, args.batch_size, args.pack, args.max_input_tokens,
+                                         args.map_reduce, args.fan_in, args.workers, args.clusters, args.top_k)
+    metrics.close()
 
     # Exibir a análise completa (para revisão)
     display_analysis(analysis_text)
@@ -0,0 +1,93 @@
+import random
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import get_metrics
+
+# Statuses worth retrying: rate limited (429) and model loading / overloaded (503)
+RETRY_STATUSES = {429, 503}
+# Jitter added to a server-hinted delay, as a fraction of the hint
+HINT_JITTER = 0.1
+
+
+# Client of the Hugging Face Inference API: one pooled keep-alive session, a timeout on
+# every call, and retries with exponential backoff and jitter on 429/503, connection
+# errors and 200 responses whose body is not valid JSON. The server's own hints (the
+# Retry-After header, or the `estimated_time` of a model that is still loading) take
+# precedence over the backoff.
+class HFInferenceClient:
+    def __init__(self, url, headers, timeout=60.0, max_retries=5, backoff=1.0, max_delay=60.0, pool_size=10):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _delay(self, attempt, response=None):
+        exponential = min(self.backoff * 2 ** attempt, self.max_delay)
+        hint = None
+        if response is not None:
+            try:
+                hint = float(response.headers["Retry-After"])
+            except (KeyError, ValueError):
+                try:
+                    hint = float(response.json().get("estimated_time"))
+                except (ValueError, TypeError, AttributeError):
+                    hint = None
+        if hint is not None:
+            # Wait what the server asked for, plus a little jitter (in proportion to the hint)
+            # so clients do not retry together
+            hint = min(hint, self.max_delay)
+            return hint + random.uniform(0, hint * HINT_JITTER)
+        # "Full jitter" backoff
+        return random.uniform(0, exponential)
+
+    # Function to POST a payload, retrying transient failures; returns the decoded JSON or None
+    def post(self, payload):
+        metrics = get_metrics()
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                with metrics.stage("request"):
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code == 200:
+                    try:
+                        return response.json()
+                    except ValueError:
+                        # A truncated or garbled body is retried like a transient failure
+                        error = f"invalid JSON in the response: {response.text[:200]}"
+                else:
+                    error = f"{response.status_code}, {response.text}"
+                    if response.status_code not in RETRY_STATUSES:
+                        break
+            if attempt == self.max_retries:
+                break
+            delay = self._delay(attempt, response)
+            print(f"Retrying in {delay:.1f}s after error: {error}")
+            metrics.count("retries")
+            time.sleep(delay)
+        print(f"Error: {error}")
+        return None
+
+    # Function to summarize several texts in one request (a list `inputs` payload); returns
+    # one summary per text (None for an element that is not a summary object), or None if
+    # the request failed
+    def summarize(self, texts, parameters=None):
+        payload = {"inputs": list(texts), "parameters": parameters or {}}
+        result = self.post(payload)
+        if not isinstance(result, list) or len(result) != len(payload["inputs"]):
+            if result is not None:
+                print(f"Error: unexpected response {str(result)[:200]}")
+            return None
+        return [item.get("summary_text") if isinstance(item, dict) else None for item in result]
+
+    def close(self):
+        self.session.close()
@@ -1,21 +1,47 @@
-import requests
-import csv
-import config  # Import your config.py file
+import argparse
+import os
+import time
+from batching import chunked
+from dedup import DEFAULT_THRESHOLD, DuplicateFanOut, find_near_duplicates
+from hf_client import HFInferenceClient
+from llm_cache import endpoint_backend, get_cache, make_key
+from loader import count_abstracts, load_abstracts, parse_shard
+from metrics import add_metrics_arguments, configure_metrics, get_metrics
+from result_sink import open_sink
+from section_parser import parse_sections
 
-# Your Hugging Face API token
-API_TOKEN = config.APY_HF
+# Inference API endpoint; HF_API_BASE_URL points it elsewhere (e.g. a local mock server)
+HF_API_BASE_URL = os.environ.get("HF_API_BASE_URL", "https://api-inference.huggingface.co")
+# Backend name in the response cache (separate for a custom HF_API_BASE_URL)
+CACHE_BACKEND = endpoint_backend("hf-api", os.environ.get("HF_API_BASE_URL"))
+MODEL_NAME = "facebook/bart-large-cnn"
+API_URL = f"{HF_API_BASE_URL}/models/{MODEL_NAME}"
+# Summary length settings sent with every request
+PARAMETERS = {"min_length": 50, "max_length": 300}  # Adjust summary length accordingly
 
-# Set up headers for the API request
-headers = {
-    "Authorization": f"Bearer {API_TOKEN}"
-}
+client = None
 
-# Function to call the Hugging Face API for structured summarization
-def get_structured_summary(abstract_text):
-    API_URL = "https://api-inference.huggingface.co/models/facebook/bart-large-cnn"
-    
+# Set up headers for the API request (the token is read on first use, so importing needs no config.py)
+def get_headers():
+    # HF_API_TOKEN, when set, takes precedence over config.py
+    token = os.environ.get("HF_API_TOKEN")
+    if token is None:
+        import config  # Import your config.py file
+        # Your Hugging Face API token
+        token = config.APY_HF
+    return {"Authorization": f"Bearer {token}"}
+
+# Shared HTTP client: pooled keep-alive connections, timeouts and retries on 429/503
+def get_client():
+    global client
+    if client is None:
+        client = HFInferenceClient(API_URL, get_headers())
+    return client
+
+# Function to build the summarization prompt for one abstract
+def build_prompt(abstract_text):
     # More explicit prompt asking for specific sections in detail
-    prompt = (
+    return (
         f"Please summarize the following abstract into the following sections clearly and concisely:\n\n"
         f"1. Objectives: What was the main purpose or goal of this study?\n"
         f"2. Problem: What problem or challenge was addressed in this study?\n"
@@ -24,91 +50,118 @@ def get_structured_summary(abstract_text):
         f"5. Results: What were the main findings or results of the study?\n\n"
         f"Abstract: {abstract_text}"
     )
-    
-    payload = {
-        "inputs": prompt,
-        "parameters": {"min_length": 50, "max_length": 300}  # Adjust summary length accordingly
-    }
-    
-    response = requests.post(API_URL, headers=headers, json=payload)
-    
-    if response.status_code == 200:
-        summary = response.json()[0]['summary_text']
-        return summary
-    else:
-        print(f"Error: {response.status_code}, {response.text}")
-        return None
-
-# Function to append the output to a CSV file immediately after each abstract
-def append_to_csv(data, output_filename="structured_summaries.csv"):
-    with open(output_filename, mode='a', newline='') as file:  # 'a' for append mode
-        writer = csv.writer(file)
-        writer.writerow([data.get('Objectives', 'N/A'), data.get('Problem', 'N/A'), data.get('Data', 'N/A'),
-                         data.get('Methods_Techniques', 'N/A'), data.get('Results', 'N/A')])
-
-# Function to parse the structured summary into a dictionary
+
+# Cache key of a summary, shared by the single and batched paths
+def cache_key(prompt):
+    return make_key(CACHE_BACKEND, MODEL_NAME, prompt, PARAMETERS)
+
+# Function to call the Hugging Face API for structured summarization
+def get_structured_summary(abstract_text):
+    prompt = build_prompt(abstract_text)
+
+    def request_summary():
+        summaries = get_client().summarize([prompt], PARAMETERS)
+        return summaries[0] if summaries else None
+
+    # Errors (None) are not cached, so they are retried on the next run
+    return get_cache().cached(CACHE_BACKEND, MODEL_NAME, prompt, PARAMETERS, request_summary)
+
+# Function to summarize several abstracts with one request per batch (a list `inputs` payload).
+# Returns one summary per abstract, in order; None where the request failed.
+def get_structured_summaries(abstract_texts):
+    cache = get_cache()
+    prompts = [build_prompt(abstract_text) for abstract_text in abstract_texts]
+    summaries = [cache.get(cache_key(prompt)) for prompt in prompts]
+
+    # Only the cache misses are sent to the API
+    pending = [i for i, summary in enumerate(summaries) if summary is None]
+    if pending:
+        results = get_client().summarize([prompts[i] for i in pending], PARAMETERS)
+        for i, summary in zip(pending, results or []):
+            summaries[i] = summary
+            cache.put(cache_key(prompts[i]), summary)
+
+    return summaries
+
+# Function to build the output row of one abstract, with the call's provenance
+def build_row(data, latency):
+    return dict(data, backend="hf-api", model=MODEL_NAME, latency_s=round(latency, 3))
+
+# Function to parse the structured summary into a dictionary (see section_parser.py)
 def parse_structured_summary(summary_text):
-    # Initialize an empty dictionary
-    parsed_data = {
-        "Objectives": "N/A",
-        "Problem": "N/A",
-        "Data": "N/A",
-        "Methods_Techniques": "N/A",
-        "Results": "N/A"
-    }
-
-    # Split the summary text into lines and process each section
-    lines = summary_text.split('\n')
-
-    current_section = None
-    for line in lines:
-        # Check if the line starts with any section label
-        if line.startswith("Objectives:"):
-            current_section = "Objectives"
-            parsed_data["Objectives"] = line.replace("Objectives:", "").strip()
-        elif line.startswith("Problem:"):
-            current_section = "Problem"
-            parsed_data["Problem"] = line.replace("Problem:", "").strip()
-        elif line.startswith("Data:"):
-            current_section = "Data"
-            parsed_data["Data"] = line.replace("Data:", "").strip()
-        elif line.startswith("Methods_Techniques:"):
-            current_section = "Methods_Techniques"
-            parsed_data["Methods_Techniques"] = line.replace("Methods_Techniques:", "").strip()
-        elif line.startswith("Results:"):
-            current_section = "Results"
-            parsed_data["Results"] = line.replace("Results:", "").strip()
-
-    return parsed_data
+    return parse_sections(summary_text)
+
+# Function to process abstracts several per request, keeping the input order in the output
+def process_abstracts_batched(abstracts, sink, batch_size):
+    for chunk in chunked(abstracts, batch_size):
+        print(f"Processing {len(chunk)} abstracts, starting with: {chunk[0][:60]}...")
+        start = time.perf_counter()
+        summaries = get_structured_summaries(chunk)
+        # One request serves the whole batch: use the batch average as the latency
+        latency = (time.perf_counter() - start) / len(chunk)
+        for abstract, summary in zip(chunk, summaries):
+            if summary:
+                with get_metrics().stage("parse"):
+                    parsed_data = parse_structured_summary(summary)
+                sink.write(abstract, build_row(parsed_data, latency))
+            else:
+                print("Skipping abstract due to error.")
+                get_metrics().count("errors")
+        get_metrics().item_done(len(chunk))
 
 # Function to process abstracts
-def process_abstracts(abstracts, output_filename="structured_summaries.csv"):
+def process_abstracts(abstracts, sink):
     for abstract in abstracts:
         print(f"Processing abstract: {abstract[:60]}...")  # Show part of the abstract for tracking
+        start = time.perf_counter()
         summary = get_structured_summary(abstract)
+        latency = time.perf_counter() - start
         if summary:
-            parsed_data = parse_structured_summary(summary)
-            append_to_csv(parsed_data, output_filename)  # Save immediately after processing
+            with get_metrics().stage("parse"):
+                parsed_data = parse_structured_summary(summary)
+            sink.write(abstract, build_row(parsed_data, latency))  # Buffered; flushed in batches
         else:
             print("Skipping abstract due to error.")
-
-# Load abstracts from file
-def load_abstracts_from_file(file_path):
-    with open(file_path, 'r') as file:
-        return file.readlines()  # Assumes each line is a new abstract
+            get_metrics().count("errors")
+        get_metrics().item_done()
 
 # Main function to execute the process
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract structured fields from abstracts with the Hugging Face Inference API.")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Abstracts sent per request as a list of inputs (fewer round trips)")
+    parser.add_argument("--dedup", type=float, nargs="?", const=DEFAULT_THRESHOLD, metavar="JACCARD",
+                        help="Extract only one abstract per cluster of near-duplicates (MinHash/LSH, default similarity "
+                             f"{DEFAULT_THRESHOLD}) and copy its row to the others")
+    parser.add_argument("--input", default="abstracts_list.txt", help="Abstracts file, one abstract per line")
+    parser.add_argument("--output", default="structured_summaries.csv", help="Output file; use a .parquet name for a Parquet dataset instead of CSV")
+    parser.add_argument("--shard", type=parse_shard, help="Process only slice i of N of the input (e.g. 0/4), to split the work across processes")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted run, skipping the abstracts already processed")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = configure_metrics(args, "huggingface")
+
     # Load your abstracts (adjust file path as needed)
-    abstracts = load_abstracts_from_file('abstracts_list.txt')
+    abstracts = load_abstracts(args.input, shard=args.shard)
     
-    # Initialize the CSV file with headers
-    with open('structured_summaries.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Objectives", "Problem", "Data", "Methods_Techniques", "Results"])
+    # Initialize the output with headers (keeping the completed rows when resuming)
+    with open_sink(args.output, resume=args.resume) as sink:
+        # Skip the abstracts already processed by a previous run
+        abstracts = sink.journal.pending(abstracts)
+        metrics.set_total(lambda: count_abstracts(args.input, args.shard, sink.journal))
+        output = sink
+        if args.dedup:
+            # Near-duplicates are not sent for extraction: they get the row of their representative
+            abstracts, duplicates = find_near_duplicates(abstracts, args.dedup)
+            output = DuplicateFanOut(sink, duplicates)
+
+        # Process the abstracts and append to the output
+        if args.batch_size > 1:
+            process_abstracts_batched(abstracts, output, args.batch_size)
+        else:
+            process_abstracts(abstracts, output)
 
-    # Process the abstracts and append to CSV
-    process_abstracts(abstracts)
+    metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,106 +1,177 @@
-import csv
-from transformers import T5ForConditionalGeneration, T5Tokenizer, BartForConditionalGeneration, BartTokenizer
+import argparse
+import time
+from batching import generate_batched, process_batched
+from llm_cache import get_cache, make_key
+from loader import count_abstracts, load_abstracts, parse_shard
+from metrics import add_metrics_arguments, configure_metrics, get_metrics
+from parallel import process_abstracts_parallel
+from onnx_engine import ENGINES, load_onnx_model, onnx_precision
+from precision import PRECISIONS, default_device, load_pretrained, resolve_precision, set_precision
+from result_sink import open_sink
+from section_parser import parse_sections
 
 # Choose whether to use T5 or BART model (uncomment one)
 MODEL_NAME = 't5-small'  # For T5
 # MODEL_NAME = 'facebook/bart-large-cnn'  # For BART
 
-# Load the pre-trained model and tokenizer
-if 't5' in MODEL_NAME:
-    model = T5ForConditionalGeneration.from_pretrained(MODEL_NAME)
-    tokenizer = T5Tokenizer.from_pretrained(MODEL_NAME)
-else:
-    model = BartForConditionalGeneration.from_pretrained(MODEL_NAME)
-    tokenizer = BartTokenizer.from_pretrained(MODEL_NAME)
+model = None
+tokenizer = None
+device = None
+# Inference engine: "torch" or "onnx" (ONNX Runtime)
+engine = "torch"
+
+# Load the pre-trained model and tokenizer (once, on first use), in the selected precision
+def load_model():
+    global model, tokenizer, device
+    if model is None:
+        # ONNX Runtime runs on the CPU; PyTorch uses the GPU if available
+        device = "cpu" if engine == "onnx" else default_device()
+        if 't5' in MODEL_NAME:
+            from transformers import T5ForConditionalGeneration as model_class, T5Tokenizer as tokenizer_class
+        else:
+            from transformers import BartForConditionalGeneration as model_class, BartTokenizer as tokenizer_class
+        if engine == "onnx":
+            model = load_onnx_model(MODEL_NAME)
+        else:
+            model = load_pretrained(model_class, MODEL_NAME, device)
+        tokenizer = tokenizer_class.from_pretrained(MODEL_NAME)
+    return tokenizer, model
+
+# Generation settings shared by the single and batched paths
+GENERATION_PARAMS = {"max_length": 300, "min_length": 50, "length_penalty": 2.0, "num_beams": 4, "early_stopping": True}
+# Default padded-token budget of one batch in batched mode
+MAX_BATCH_TOKENS = 8192
+# Inputs are truncated to this many tokens, on the single and batched paths alike
+MAX_INPUT_TOKENS = 512
+
+# Function to build the model input for one abstract
+def build_input_text(abstract_text):
+    # Add 'summarize:' prefix for T5, not necessary for BART
+    return f"summarize: {abstract_text}" if 't5' in MODEL_NAME else abstract_text
+
+# Generation settings plus the engine and precision, which can change the output, for the cache keys
+def cache_params():
+    if engine == "onnx":
+        return dict(GENERATION_PARAMS, precision=onnx_precision(), engine="onnx")
+    return dict(GENERATION_PARAMS, precision=resolve_precision(device or default_device()))
+
+# Cache key of a generation, shared by the single and batched paths
+def cache_key(input_text):
+    return make_key("local", MODEL_NAME, input_text, cache_params())
 
 # Function to summarize the abstract
 def get_structured_summary(abstract_text):
-    # Add 'summarize:' prefix for T5, not necessary for BART
-    input_text = f"summarize: {abstract_text}" if 't5' in MODEL_NAME else abstract_text
-    input_ids = tokenizer.encode(input_text, return_tensors="pt", max_length=512, truncation=True)
-    
-    # Generate the summary
-    summary_ids = model.generate(input_ids, max_length=300, min_length=50, length_penalty=2.0, num_beams=4, early_stopping=True)
-    summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+    input_text = build_input_text(abstract_text)
+
+    def generate_summary():
+        load_model()
+        metrics = get_metrics()
+        with metrics.stage("tokenize"):
+            input_ids = tokenizer.encode(input_text, return_tensors="pt", max_length=MAX_INPUT_TOKENS, truncation=True).to(device)
+
+        # Generate the summary
+        with metrics.stage("generate"):
+            summary_ids = model.generate(input_ids, **GENERATION_PARAMS)
+        metrics.count("tokens_in", input_ids.shape[1])
+        metrics.count("tokens_out", summary_ids.shape[1])
+        return tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+
+    summary = get_cache().cached("local", MODEL_NAME, input_text, cache_params(), generate_summary)
     
     # Print and return the generated summary
     print(f"Generated Summary:\n{summary}\n")  # Log summary for debugging
     return summary
 
-# Function to append the output to a CSV file
-def append_to_csv(data, output_filename="structured_summaries.csv"):
-    with open(output_filename, mode='a', newline='') as file:  # 'a' for append mode
-        writer = csv.writer(file)
-        writer.writerow([data.get('Objectives', 'N/A'), data.get('Problem', 'N/A'), data.get('Data', 'N/A'),
-                         data.get('Methods_Techniques', 'N/A'), data.get('Results', 'N/A')])
+# Function to summarize several abstracts at once, in length-bucketed padded batches
+def get_structured_summaries(abstract_texts, max_batch_tokens=MAX_BATCH_TOKENS):
+    return generate_batched([build_input_text(abstract_text) for abstract_text in abstract_texts], cache_key,
+                            lambda: load_model() + (device,), GENERATION_PARAMS, max_batch_tokens, MAX_INPUT_TOKENS)
 
-# Function to parse the summary
+# Function to build the output row of one abstract, with the call's provenance
+def build_row(data, latency):
+    backend = "onnxruntime" if engine == "onnx" else "transformers"
+    return dict(data, backend=backend, model=MODEL_NAME, latency_s=round(latency, 3))
+
+# Function to parse the summary into structured sections (see section_parser.py)
 def parse_structured_summary(summary_text):
-    # Initialize an empty dictionary
-    parsed_data = {
-        "Objectives": "N/A",
-        "Problem": "N/A",
-        "Data": "N/A",
-        "Methods_Techniques": "N/A",
-        "Results": "N/A"
-    }
-
-    # Check if summary is empty
-    if not summary_text or summary_text.strip() == "":
-        print("Empty summary generated, skipping.")
-        return parsed_data
-
-    # Check if summary contains meaningful text
-    lines = summary_text.split('\n')
-    if len(lines) == 0:
-        print("No lines found in summary, skipping.")
-        return parsed_data
-
-    # Try to extract known sections
-    for line in lines:
-        if "Objectives" in line:
-            parsed_data["Objectives"] = line.split(":", 1)[1].strip() if ":" in line else "N/A"
-        elif "Problem" in line:
-            parsed_data["Problem"] = line.split(":", 1)[1].strip() if ":" in line else "N/A"
-        elif "Data" in line:
-            parsed_data["Data"] = line.split(":", 1)[1].strip() if ":" in line else "N/A"
-        elif "Methods_Techniques" in line:
-            parsed_data["Methods_Techniques"] = line.split(":", 1)[1].strip() if ":" in line else "N/A"
-        elif "Results" in line:
-            parsed_data["Results"] = line.split(":", 1)[1].strip() if ":" in line else "N/A"
-    
-    return parsed_data
+    return parse_sections(summary_text)
+
+# Function to process abstracts in batches, keeping the input order in the CSV
+def process_abstracts_batched(abstracts, sink, max_batch_tokens=MAX_BATCH_TOKENS, chunk_size=64):
+    process_batched(abstracts, sink, lambda chunk: get_structured_summaries(chunk, max_batch_tokens),
+                    parse_structured_summary, build_row, chunk_size)
 
 # Function to process abstracts
-def process_abstracts(abstracts, output_filename="structured_summaries.csv"):
+def process_abstracts(abstracts, sink):
+    processed = 0
+    run_start = time.perf_counter()
     for abstract in abstracts:
         print(f"Processing abstract: {abstract[:60]}...")  # Show part of the abstract for tracking
+        start = time.perf_counter()
         summary = get_structured_summary(abstract)
+        latency = time.perf_counter() - start
         
         # Check if summary is valid
         if summary:
-            parsed_data = parse_structured_summary(summary)
-            append_to_csv(parsed_data, output_filename)  # Save immediately after processing
+            with get_metrics().stage("parse"):
+                parsed_data = parse_structured_summary(summary)
+            sink.write(abstract, build_row(parsed_data, latency))  # Buffered; flushed in batches
         else:
             print("Skipping abstract due to error.")
+            get_metrics().count("errors")
+        processed += 1
+        get_metrics().item_done()
 
-# Load abstracts from file
-def load_abstracts_from_file(file_path):
-    with open(file_path, 'r') as file:
-        return file.readlines()  # Assumes each line is a new abstract
+    if processed:
+        elapsed = time.perf_counter() - run_start
+        print(f"{processed} abstracts in {elapsed:.1f}s ({processed / elapsed:.2f} abstracts/s)")
 
 # Main function to execute the process
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Summarize abstracts with {MODEL_NAME}.")
+    parser.add_argument("--batched", action="store_true", help="Generate length-bucketed batches instead of one abstract at a time")
+    parser.add_argument("--max-batch-tokens", type=int, default=MAX_BATCH_TOKENS,
+                        help="Padded-token budget of one batch (batch size x longest input)")
+    parser.add_argument("--precision", choices=PRECISIONS, default="auto",
+                        help="Model precision: fp32, bf16 (native-bf16 CPUs and GPUs), int8 (dynamic quantization, CPU) or auto")
+    parser.add_argument("--engine", choices=ENGINES, default="torch",
+                        help="Inference engine: eager PyTorch or ONNX Runtime on CPU (exported once; int8 graphs with --precision int8)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Data-parallel CPU mode: worker processes, each running the model on its own cores")
+    parser.add_argument("--threads-per-worker", type=int, help="PyTorch threads of each worker (default: the cores split evenly)")
+    parser.add_argument("--input", default="abstracts_list.txt", help="Abstracts file, one abstract per line")
+    parser.add_argument("--output", default="structured_summaries.csv", help="Output file; use a .parquet name for a Parquet dataset instead of CSV")
+    parser.add_argument("--shard", type=parse_shard, help="Process only slice i of N of the input (e.g. 0/4), to split the work across processes")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted run, skipping the abstracts already processed")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.workers > 1 and (args.batched or args.engine == "onnx"):
+        parser.error("--workers runs the PyTorch engine one abstract at a time: it cannot be combined with --batched or --engine onnx")
+    metrics = configure_metrics(args, "huggingt5bart")
+    set_precision(args.precision)
+    global engine
+    engine = args.engine
+
     # Load your abstracts (adjust file path as needed)
-    abstracts = load_abstracts_from_file('abstracts_list.txt')
+    abstracts = load_abstracts(args.input, shard=args.shard)
     
-    # Initialize the CSV file with headers
-    with open('structured_summaries.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Objectives", "Problem", "Data", "Methods_Techniques", "Results"])
+    # Initialize the output with headers (keeping the completed rows when resuming)
+    with open_sink(args.output, resume=args.resume) as sink:
+        # Skip the abstracts already processed by a previous run
+        abstracts = sink.journal.pending(abstracts)
+        metrics.set_total(lambda: count_abstracts(args.input, args.shard, sink.journal))
+
+        # Process the abstracts and append to the output
+        if args.batched:
+            process_abstracts_batched(abstracts, sink, max_batch_tokens=args.max_batch_tokens)
+        elif args.workers > 1:
+            # One process per block of cores; the weights are loaded once and shared through fork
+            process_abstracts_parallel(abstracts, sink, get_structured_summary, build_row, parse_structured_summary,
+                                       args.workers, args.threads_per_worker, load=load_model)
+        else:
+            process_abstracts(abstracts, sink)
 
-    # Process the abstracts and append to CSV
-    process_abstracts(abstracts)
+    metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
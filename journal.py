@@ -0,0 +1,79 @@
+import csv
+import hashlib
+import io
+import os
+
+# Length of the hex IDs written to the journal
+ID_LENGTH = 16
+
+
+# Function to compute the stable ID of an abstract (content hash of its line)
+def abstract_id(abstract_text):
+    return hashlib.sha1(abstract_text.strip().encode("utf-8")).hexdigest()[:ID_LENGTH]
+
+
+# Journal of completed abstract IDs, kept next to the output file as "<output>.journal".
+# A row is always appended to the output before its ID is journaled, so the journal
+# never claims work that is missing from the output.
+class Journal:
+    def __init__(self, output_filename):
+        self.path = output_filename + ".journal"
+        entries = self._load()
+        self.completed = set(entries)
+        # Number of journaled rows (duplicated abstracts are journaled once per row)
+        self.rows = len(entries)
+        self._file = open(self.path, mode='a')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r') as file:
+            content = file.read()
+        lines = content.split('\n')
+        # A torn last entry (no trailing newline) is dropped and rewritten away
+        if not content.endswith('\n'):
+            lines = lines[:-1]
+            with open(self.path, 'w') as file:
+                file.writelines(line + '\n' for line in lines if line)
+        return [line for line in lines if len(line) == ID_LENGTH]
+
+    def is_done(self, abstract_text):
+        return abstract_id(abstract_text) in self.completed
+
+    # Abstracts of `abstracts` that are not journaled yet, in input order (lazily)
+    def pending(self, abstracts):
+        return (abstract for abstract in abstracts if not self.is_done(abstract))
+
+    def mark_done(self, abstract_text):
+        identifier = abstract_id(abstract_text)
+        self.completed.add(identifier)
+        self.rows += 1
+        self._file.write(identifier + '\n')
+        self._file.flush()
+
+    def reset(self):
+        self._file.close()
+        self._file = open(self.path, mode='w')
+        self.completed = set()
+        self.rows = 0
+
+    def close(self):
+        self._file.close()
+
+
+# Function to drop output rows that are not covered by the journal (torn or unjournaled rows)
+def repair_csv(output_filename, completed_rows):
+    with open(output_filename, mode='r', newline='') as file:
+        content = file.read()
+    rows = list(csv.reader(io.StringIO(content, newline='')))
+    # Without a final newline the last row was cut off while being written
+    torn = bool(content) and not content.endswith('\n')
+    keep = rows[:1 + completed_rows]
+    if not torn and len(keep) == len(rows):
+        return
+    print(f"Repairing {output_filename}: keeping {len(keep) - 1} of {len(rows) - 1} rows.")
+    temporary = output_filename + ".tmp"
+    with open(temporary, mode='w', newline='') as file:
+        csv.writer(file).writerows(keep)
+    os.replace(temporary, output_filename)
+
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+# Function to build an analyzer over already-lemmatized token lists, with n-grams
+def lemma_analyzer(ngram_range=(1, 1)):
+    low, high = ngram_range
+
+    def analyze(lemmas):
+        terms = []
+        for n in range(low, high + 1):
+            terms.extend(" ".join(lemmas[i:i + n]) for i in range(len(lemmas) - n + 1))
+        return terms
+
+    return analyze
+
+
+# Keyword counts of several columns, held as one sparse document-term matrix with a
+# shared vocabulary; each column is a contiguous block of rows
+class KeywordCounts:
+    def __init__(self, matrix, terms, row_ranges):
+        self.matrix = matrix
+        self.terms = terms
+        self.row_ranges = row_ranges
+
+    def column_matrix(self, column):
+        start, end = self.row_ranges[column]
+        return self.matrix[start:end]
+
+    def _top(self, values, top_n):
+        order = np.argsort(-values, kind="stable")[:top_n]
+        return [(self.terms[i], int(values[i])) for i in order if values[i] > 0]
+
+    # Most frequent terms of a column: [(term, count), ...]
+    def top_keywords(self, column, top_n=10):
+        return self._top(np.asarray(self.column_matrix(column).sum(axis=0)).ravel(), top_n)
+
+    # Terms present in the most documents of a column: [(term, documents), ...]
+    def document_frequency(self, column, top_n=10):
+        return self._top(self.column_matrix(column).getnnz(axis=0), top_n)
+
+    # Terms that set a column apart from the other columns (TF-IDF over column totals)
+    def distinctive_terms(self, column, top_n=10):
+        from sklearn.feature_extraction.text import TfidfTransformer
+        columns = list(self.row_ranges)
+        totals = np.vstack([np.asarray(self.column_matrix(name).sum(axis=0)).ravel() for name in columns])
+        weights = TfidfTransformer().fit_transform(totals).toarray()[columns.index(column)]
+        order = np.argsort(-weights, kind="stable")[:top_n]
+        return [(self.terms[i], float(weights[i])) for i in order if weights[i] > 0]
+
+
+# Function to count the keywords of several columns in one pass.
+# `columns` maps a column name to its documents, each one a list of lemmas.
+def count_keywords(columns, ngram_range=(1, 1)):
+    # Imported here: scikit-learn takes about a second to load, which --help does not need
+    from sklearn.feature_extraction.text import CountVectorizer
+    documents = []
+    row_ranges = {}
+    for name, column_documents in columns.items():
+        start = len(documents)
+        documents.extend(column_documents)
+        row_ranges[name] = (start, len(documents))
+
+    vectorizer = CountVectorizer(analyzer=lemma_analyzer(ngram_range))
+    try:
+        matrix = vectorizer.fit_transform(documents).tocsr()
+        terms = vectorizer.get_feature_names_out()
+    except ValueError:
+        # No terms at all (empty columns): keep an empty matrix
+        from scipy.sparse import csr_matrix
+        matrix = csr_matrix((len(documents), 0), dtype=np.int64)
+        terms = np.array([], dtype=object)
+    return KeywordCounts(matrix, terms, row_ranges)
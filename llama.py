@@ -1,66 +1,172 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-import csv
+import argparse
+import time
+from assisted import assisted_params, load_draft_model
+from llm_cache import get_cache
+from loader import count_abstracts, load_abstracts, parse_shard
+from metrics import add_metrics_arguments, configure_metrics, get_metrics
+from parallel import process_abstracts_parallel
+from precision import PRECISIONS, default_device, load_pretrained, resolve_precision, set_precision
+from prefix_cache import PrefixCache
+from result_sink import PROBLEM_COLUMNS, open_sink
+from stopping import SentenceStoppingCriteria
 
 # Use the LLaMA-2 int8 model for better performance on lower hardware
 model_name = "meta-llama/Llama-2-7b-hf-int8"  # Use the int8 version of the model
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForCausalLM.from_pretrained(model_name)
+tokenizer = None
+model = None
+device = None
+# Attention states of the prompt header, computed once (--prefix-cache mode)
+use_prefix_cache = False
+prefix_cache = None
+# Draft model of assisted decoding (--draft-model mode): TinyLlama shares the LLaMA-2
+# tokenizer and proposes the tokens that LLaMA-2 checks in one pass
+DRAFT_MODEL = "TinyLlama/TinyLlama-1.1B-intermediate-step-1431k-3T"
+draft_model_name = None
+draft_model = None
+# Stop generating at the end of the first sentence of the answer instead of at max_new_tokens
+early_stop = True
 
-# Move the model to the GPU if available, or use CPU
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = model.to(device)
+# Load the model and tokenizer (once, on first use)
+def load_model():
+    global tokenizer, model, device
+    if model is None:
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Move the model to the GPU if available, or use CPU, in the selected precision
+        device = default_device()
+        model = load_pretrained(AutoModelForCausalLM, model_name, device)
+    # Also load the draft model when assisted decoding is on
+    global draft_model
+    if draft_model_name and draft_model is None:
+        draft_model = load_draft_model(model, draft_model_name, device)
+    return tokenizer, model
+
+# Prompt asking only for the problem; the header is the same for every abstract
+PROMPT_HEADER = "What problem does the study aim to solve?\n\nAbstract:"
+
+# Compute the attention states of the prompt header (once)
+def get_prefix_cache():
+    global prefix_cache
+    if prefix_cache is None:
+        load_model()
+        prefix_cache = PrefixCache(model, tokenizer, PROMPT_HEADER, device)
+    return prefix_cache
 
 # Function to extract the problem the study aims to solve
 def get_problem_summary(abstract_text):
-    # Prompt asking only for the problem
-    prompt = f"What problem does the study aim to solve?\n\nAbstract: {abstract_text}"
+    prompt = f"{PROMPT_HEADER} {abstract_text}"
     
-    # Tokenize input
-    inputs = tokenizer(prompt, return_tensors="pt").to(device)
+    # Greedy decoding, explicitly: LLaMA-2 checkpoints ship with do_sample=True in their generation config
+    generation_params = {"max_new_tokens": 50, "num_beams": 1, "do_sample": False}
+
+    def generate_summary():
+        load_model()
+        metrics = get_metrics()
+        # Tokenize input
+        with metrics.stage("tokenize"):
+            inputs = tokenizer(prompt, return_tensors="pt").to(device)
+
+        # Generate the summary using reduced max_new_tokens and simplified settings
+        # (in --prefix-cache mode, starting from the cached states of the header)
+        # (in --draft-model mode, with the draft model proposing the tokens)
+        # Stop on the generated text (the echoed prompt is left out)
+        stopping_criteria = [SentenceStoppingCriteria(tokenizer, inputs["input_ids"].shape[1])] if early_stop else None
+        generate = get_prefix_cache().generate if use_prefix_cache else model.generate
+        with metrics.stage("generate"):
+            summary_ids = generate(inputs["input_ids"], attention_mask=inputs["attention_mask"],
+                                   stopping_criteria=stopping_criteria,
+                                   **assisted_params(model, generation_params, draft_model))
+        metrics.count("tokens_in", inputs["input_ids"].shape[1])
+        metrics.count("tokens_out", summary_ids.shape[1] - inputs["input_ids"].shape[1])
+        return tokenizer.decode(summary_ids[0], skip_special_tokens=True)
 
-    # Generate the summary using reduced max_new_tokens and simplified settings
-    summary_ids = model.generate(inputs["input_ids"], max_new_tokens=50, num_beams=1)
-    summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+    # The precision can change the output, so it is part of the cache key
+    # Assisted decoding does not change it (greedy decoding), so it is not
+    # Early stopping shortens the output, so it is part of the key too
+    cache_params = dict(generation_params, precision=resolve_precision(device or default_device()))
+    if early_stop:
+        cache_params["stop"] = "sentence"
+    summary = get_cache().cached("local", model_name, prompt, cache_params, generate_summary)
     
     print(f"Extracted Problem:\n{summary}\n")  # Log summary for debugging
     return summary
 
-# Function to append the problem to a CSV file
-def append_problem_to_csv(problem, output_filename="problem_summaries.csv"):
-    with open(output_filename, mode='a', newline='') as file:  # 'a' for append mode
-        writer = csv.writer(file)
-        writer.writerow([problem])
+# Function to build the output row of one abstract, with the call's provenance
+def build_row(problem, latency):
+    return {"backend": "transformers", "model": model_name, "latency_s": round(latency, 3), "Problem": problem}
 
 # Function to process abstracts and extract the problem
-def process_abstracts(abstracts, output_filename="problem_summaries.csv"):
+def process_abstracts(abstracts, sink):
+    processed = 0
+    run_start = time.perf_counter()
     for abstract in abstracts:
         print(f"Processing abstract: {abstract[:60]}...")  # Show part of the abstract for tracking
+        start = time.perf_counter()
         problem = get_problem_summary(abstract)
+        latency = time.perf_counter() - start
         
         # Check if problem is valid and append to CSV
         if problem:
-            append_problem_to_csv(problem, output_filename)  # Save immediately after processing
+            sink.write(abstract, build_row(problem, latency))  # Buffered; flushed in batches
         else:
             print("Skipping abstract due to error.")
+            get_metrics().count("errors")
+        processed += 1
+        get_metrics().item_done()
 
-# Load abstracts from file
-def load_abstracts_from_file(file_path):
-    with open(file_path, 'r') as file:
-        return file.readlines()  # Assumes each line is a new abstract
+    if processed:
+        elapsed = time.perf_counter() - run_start
+        print(f"{processed} abstracts in {elapsed:.1f}s ({processed / elapsed:.2f} abstracts/s)")
 
 # Main function to execute the process
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract the problem of each abstract with LLaMA-2.")
+    parser.add_argument("--precision", choices=PRECISIONS, default="auto",
+                        help="Model precision: fp32, bf16 (native-bf16 CPUs and GPUs), int8 (dynamic quantization, CPU) or auto")
+    parser.add_argument("--prefix-cache", action="store_true", help="Prefill the fixed prompt header once and reuse its attention states")
+    parser.add_argument("--draft-model", nargs="?", const=DRAFT_MODEL,
+                        help="Assisted (speculative) decoding: a small model proposes the tokens and LLaMA-2 checks them in one forward pass, without changing the output (default: TinyLlama-1.1B)")
+    parser.add_argument("--no-early-stop", action="store_true", help="Generate up to max_new_tokens instead of stopping at the end of the first sentence of the answer")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Data-parallel CPU mode: worker processes, each running the model on its own cores")
+    parser.add_argument("--threads-per-worker", type=int, help="PyTorch threads of each worker (default: the cores split evenly)")
+    parser.add_argument("--input", default="abstracts_list.txt", help="Abstracts file, one abstract per line")
+    parser.add_argument("--output", default="problem_summaries.csv", help="Output file; use a .parquet name for a Parquet dataset instead of CSV")
+    parser.add_argument("--shard", type=parse_shard, help="Process only slice i of N of the input (e.g. 0/4), to split the work across processes")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted run, skipping the abstracts already processed")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.prefix_cache and args.draft_model:
+        parser.error("--draft-model cannot be combined with --prefix-cache: the draft model does not have the header states")
+    metrics = configure_metrics(args, "llama")
+    set_precision(args.precision)
+    global use_prefix_cache, draft_model_name, early_stop
+    use_prefix_cache = args.prefix_cache
+    draft_model_name = args.draft_model
+    early_stop = not args.no_early_stop
+
     # Load your abstracts (adjust file path as needed)
-    abstracts = load_abstracts_from_file('abstracts_list.txt')
+    abstracts = load_abstracts(args.input, shard=args.shard)
+
+    # Initialize the output with headers (keeping the completed rows when resuming)
+    with open_sink(args.output, columns=PROBLEM_COLUMNS, resume=args.resume) as sink:
+        # Skip the abstracts already processed by a previous run
+        abstracts = sink.journal.pending(abstracts)
+        metrics.set_total(lambda: count_abstracts(args.input, args.shard, sink.journal))
+
+        # Process the abstracts and append to the output
+        if args.workers > 1:
+            # One process per block of cores; the weights (and the prompt header) are loaded once and shared through fork
+            process_abstracts_parallel(abstracts, sink, get_problem_summary, build_row, workers=args.workers,
+                                       threads=args.threads_per_worker,
+                                       load=get_prefix_cache if use_prefix_cache else load_model)
+        else:
+            process_abstracts(abstracts, sink)
 
-    # Initialize the CSV file with headers
-    with open('problem_summaries.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Problem"])
+    if prefix_cache is not None:
+        print(prefix_cache.stats())
 
-    # Process the abstracts and append to CSV
-    process_abstracts(abstracts)
+    metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from metrics import get_metrics
+
+# Where the shared response cache lives and how big it may grow
+DEFAULT_CACHE_PATH = os.environ.get("ABSTRACT_CACHE_PATH", ".llm_cache.sqlite")
+DEFAULT_MAX_BYTES = int(os.environ.get("ABSTRACT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# After an eviction the cache is trimmed to this fraction of max_bytes
+EVICTION_TARGET = 0.9
+
+
+# Function to build the content-addressed key of an LLM call
+def make_key(backend, model, prompt, params=None):
+    payload = json.dumps([backend, model, prompt, params or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Function to name the backend in the cache keys: responses of a non-default endpoint (e.g.
+# a local mock server) are kept apart from those of the real API
+def endpoint_backend(backend, base_url=None):
+    return f"{backend}@{base_url}" if base_url else backend
+
+
+# SQLite response cache with size-based LRU eviction and hit/miss counters
+class LLMCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = 0
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._conn
+
+    # Return the cached response for `key`, or None on a miss
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                get_metrics().count("cache_misses")
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            get_metrics().count("cache_hits")
+            return row[0]
+
+    # Store a response and evict the least recently used entries if over budget
+    def put(self, key, value):
+        if not self.enabled or value is None:
+            return
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            previous = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if previous is not None:
+                self._total_bytes -= previous[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        target = self.max_bytes * EVICTION_TARGET
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    # Return the cached response for this call or compute and store it
+    def cached(self, backend, model, prompt, params, compute):
+        key = make_key(backend, model, prompt, params)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    # Same as cached, for coroutine functions
+    async def cached_async(self, backend, model, prompt, params, compute):
+        key = make_key(backend, model, prompt, params)
+        value = self.get(key)
+        if value is None:
+            value = await compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_cache = None
+
+
+# Shared cache instance; set ABSTRACT_CACHE=off to bypass it
+def get_cache():
+    global _default_cache
+    if _default_cache is None:
+        enabled = os.environ.get("ABSTRACT_CACHE", "on").lower() not in {"0", "off", "false", "no"}
+        _default_cache = LLMCache(enabled=enabled)
+    return _default_cache
+
+
+# Replace the shared cache in a forked worker process: a SQLite connection must not be
+# used across processes, so the worker opens its own on first use
+def reset_cache_after_fork():
+    global _default_cache
+    if _default_cache is not None:
+        _default_cache = LLMCache(_default_cache.path, _default_cache.max_bytes, _default_cache.enabled)
+
+
+# Turn the shared cache on or off for the current run (e.g. from a --no-cache flag)
+def set_cache_enabled(enabled):
+    get_cache().enabled = enabled
@@ -0,0 +1,74 @@
+import argparse
+import mmap
+import os
+from journal import abstract_id
+
+
+# Function to parse a "--shard i/N" argument into (i, N). It is the argparse type of
+# --shard, so it raises ArgumentTypeError, whose message argparse shows as it is.
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected i/N (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected 0 <= i < N")
+    return index, count
+
+
+# Function to find the byte range [start, end) of a shard. Lines belong to the shard
+# in which they start, so every line is read by exactly one worker.
+def _shard_range(data, shard):
+    size = len(data)
+    if shard is None:
+        return 0, size
+    index, count = shard
+    start = size * index // count
+    end = size * (index + 1) // count
+    # Skip the line that started in the previous shard
+    if start > 0 and data[start - 1:start] != b"\n":
+        newline = data.find(b"\n", start)
+        start = size if newline == -1 else newline + 1
+    return start, end
+
+
+# Function to stream (id, text) records from a file with one abstract per line.
+# The file is memory-mapped and read lazily; whitespace is normalized, empty lines
+# are skipped and exact duplicates are dropped. IDs are content hashes, so they are
+# stable across runs, shards and the --resume journal. Duplicates are only detected
+# within a shard.
+def iter_abstract_records(file_path, shard=None):
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start, end = _shard_range(data, shard)
+            seen = set()
+            position = start
+            while position < end:
+                newline = data.find(b"\n", position)
+                line_end = len(data) if newline == -1 else newline
+                text = " ".join(data[position:line_end].decode("utf-8", errors="replace").split())
+                position = line_end + 1
+                if not text:
+                    continue
+                identifier = abstract_id(text)
+                if identifier in seen:
+                    continue
+                seen.add(identifier)
+                yield identifier, text
+
+
+# Function to stream the abstract texts of a file (see iter_abstract_records)
+def load_abstracts(file_path, shard=None):
+    for _, text in iter_abstract_records(file_path, shard):
+        yield text
+
+
+# Function to count the abstracts of a file (or shard) that are not journaled yet,
+# e.g. to show an ETA; one extra pass over the file
+def count_abstracts(file_path, shard=None, journal=None):
+    return sum(
+        1 for identifier, _ in iter_abstract_records(file_path, shard)
+        if journal is None or identifier not in journal.completed
+    )
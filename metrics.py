@@ -0,0 +1,194 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# A disabled stage timer; shared, so timing a stage costs one attribute check when off
+_NULL_STAGE = contextlib.nullcontext()
+
+
+# Function to format a duration as HH:MM:SS, with a day count in front beyond 24 hours
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    clock = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{days}d {clock}" if days else clock
+
+
+# Timer of one stage call, recorded when the block exits
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics._record_stage(self.name, time.perf_counter() - self.start, failed=exc_type is not None)
+
+
+# Per-stage timers and counters of a pipeline run. Stages (tokenize, generate, request,
+# parse, write, ...) are timed with `with metrics.stage(name):`; counters (items,
+# tokens_in, tokens_out, retries, errors, cache_hits, ...) with `metrics.count(name, n)`.
+# Outputs: a JSON-lines event log, a periodic progress line with throughput and ETA, and
+# a Prometheus text-format file for the node exporter's textfile collector.
+# When disabled every call returns immediately.
+class Metrics:
+    def __init__(self, script="abstract", log_path=None, prometheus_path=None, progress_seconds=None, enabled=None):
+        self.script = script
+        self.enabled = bool(log_path or prometheus_path or progress_seconds) if enabled is None else enabled
+        self.prometheus_path = prometheus_path
+        self.progress_seconds = progress_seconds
+        self.total = None
+        self.items = 0
+        self.counters = {}
+        self.stage_seconds = {}
+        self.stage_calls = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_report = time.monotonic()
+        self._log = open(log_path, "a") if self.enabled and log_path else None
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    # Set the number of items expected in this run (for the ETA). `total` may be a
+    # function, only called when metrics are enabled, since counting can cost a file pass.
+    def set_total(self, total):
+        if self.enabled:
+            self.total = total() if callable(total) else total
+
+    # Count finished items and report progress when the period has passed
+    def item_done(self, count=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.items += count
+            due = time.monotonic() - self._last_report >= (self.progress_seconds or 10)
+            if due:
+                self._last_report = time.monotonic()
+        if due:
+            self.report()
+
+    def _record_stage(self, name, seconds, failed=False):
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+            self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+        self._event("stage", stage=name, seconds=round(seconds, 6), failed=failed)
+
+    def _event(self, event, **fields):
+        if self._log is None:
+            return
+        line = json.dumps(dict(ts=round(time.time(), 3), script=self.script, event=event, **fields))
+        with self._lock:
+            self._log.write(line + "\n")
+
+    # Snapshot of the run: items, throughput, ETA, counters and time per stage
+    def summary(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self._start
+            rate = self.items / elapsed if elapsed > 0 else 0.0
+            remaining = None if self.total is None else max(self.total - self.items, 0)
+            return {
+                "items": self.items,
+                "total": self.total,
+                "elapsed_s": round(elapsed, 3),
+                "items_per_s": round(rate, 3),
+                "eta_s": round(remaining / rate, 1) if remaining is not None and rate > 0 else None,
+                "counters": dict(self.counters),
+                "stage_seconds": {name: round(seconds, 3) for name, seconds in self.stage_seconds.items()},
+                "stage_calls": dict(self.stage_calls),
+            }
+
+    # Print the progress line and refresh the log and the Prometheus file
+    def report(self):
+        summary = self.summary()
+        if self.progress_seconds:
+            done = f"{summary['items']}/{summary['total']}" if summary["total"] is not None else str(summary["items"])
+            eta = f", ETA {format_duration(summary['eta_s'])}" if summary["eta_s"] is not None else ""
+            stages = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in summary["stage_seconds"].items())
+            print(f"[{self.script}] {done} items, {summary['items_per_s']:.2f} items/s{eta}" + (f" ({stages})" if stages else ""))
+        self._event("progress", **summary)
+        if self._log is not None:
+            self._log.flush()
+        self.write_prometheus(summary)
+
+    def write_prometheus(self, summary=None):
+        if not self.prometheus_path:
+            return
+        summary = summary or self.summary()
+        label = f'script="{self.script}"'
+        lines = [
+            "# TYPE abstract_items_total counter",
+            f"abstract_items_total{{{label}}} {summary['items']}",
+            "# TYPE abstract_items_per_second gauge",
+            f"abstract_items_per_second{{{label}}} {summary['items_per_s']}",
+        ]
+        if summary["eta_s"] is not None:
+            lines += ["# TYPE abstract_eta_seconds gauge", f"abstract_eta_seconds{{{label}}} {summary['eta_s']}"]
+        lines.append("# TYPE abstract_stage_seconds_total counter")
+        lines += [f'abstract_stage_seconds_total{{{label},stage="{name}"}} {seconds}'
+                  for name, seconds in summary["stage_seconds"].items()]
+        lines.append("# TYPE abstract_stage_calls_total counter")
+        lines += [f'abstract_stage_calls_total{{{label},stage="{name}"}} {calls}'
+                  for name, calls in summary["stage_calls"].items()]
+        lines.append("# TYPE abstract_events_total counter")
+        lines += [f'abstract_events_total{{{label},event="{name}"}} {value}'
+                  for name, value in summary["counters"].items()]
+        # Written atomically so the collector never reads a partial file
+        temporary = self.prometheus_path + ".tmp"
+        with open(temporary, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temporary, self.prometheus_path)
+
+    def close(self):
+        if not self.enabled:
+            return
+        self.report()
+        self._event("summary", **self.summary())
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+_metrics = Metrics(enabled=False)
+
+
+# Function to get the metrics of the current run (disabled unless configured)
+def get_metrics():
+    return _metrics
+
+
+# Function to turn the metrics off in a worker process, whose parent reports for the run
+def disable_metrics():
+    global _metrics
+    _metrics = Metrics(enabled=False)
+
+
+# Function to add the instrumentation options to a script's argument parser
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-log", help="Append per-stage timings and progress as JSON lines to this file")
+    parser.add_argument("--metrics-prom", help="Keep Prometheus text-format metrics in this file (node exporter textfile collector)")
+    parser.add_argument("--progress", type=float, metavar="SECONDS",
+                        help="Print a progress summary with throughput and ETA every SECONDS seconds")
+
+
+# Function to set up the metrics of a run from the parsed options (see add_metrics_arguments)
+def configure_metrics(args, script):
+    global _metrics
+    _metrics = Metrics(script, log_path=args.metrics_log, prometheus_path=args.metrics_prom, progress_seconds=args.progress)
+    return _metrics
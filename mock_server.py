@@ -0,0 +1,252 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenAI chat-completions and Hugging Face Inference APIs, so the
+# API-based scripts can be load-tested offline. Point them at it with
+#   OPENAI_BASE_URL=http://127.0.0.1:<port>/v1  OPENAI_API_KEY=mock
+#   HF_API_BASE_URL=http://127.0.0.1:<port>     HF_API_TOKEN=mock
+# Latency follows a configurable distribution, 429/503 errors can be injected at random
+# or by a requests-per-minute limit, and GET /stats returns the request counters.
+
+SECTIONS = ["Objectives", "Problem", "Data", "Methods and Techniques", "Results"]
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "normal", "lognormal", "exponential"]
+
+
+# Function to build a canned structured answer that mentions the start of the abstract
+def canned_summary(text, methods_label="Methods and Techniques"):
+    excerpt = " ".join(text.split("Abstract:")[-1].split()[:12])
+    return "\n".join(
+        f"{methods_label if section == 'Methods and Techniques' else section}: {section} of the study on {excerpt}."
+        for section in SECTIONS
+    )
+
+
+# Response delay drawn from a distribution with the given mean (seconds); `spread` is the
+# half-width (uniform), standard deviation (normal) or sigma of the log (lognormal)
+class LatencyModel:
+    def __init__(self, distribution="fixed", mean=0.0, spread=0.0, seed=None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}'")
+        self.distribution = distribution
+        self.mean = mean
+        self.spread = spread
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if self.mean <= 0:
+            return 0.0
+        with self._lock:
+            if self.distribution == "uniform":
+                value = self._random.uniform(self.mean - self.spread, self.mean + self.spread)
+            elif self.distribution == "normal":
+                value = self._random.gauss(self.mean, self.spread)
+            elif self.distribution == "lognormal":
+                # mu chosen so that the mean of the distribution is `mean`
+                value = self._random.lognormvariate(math.log(self.mean) - self.spread ** 2 / 2, self.spread)
+            elif self.distribution == "exponential":
+                value = self._random.expovariate(1 / self.mean)
+            else:
+                value = self.mean
+        return max(value, 0.0)
+
+
+# Behaviour of the mock: latency, injected errors, rate limit and canned outputs
+class MockConfig:
+    def __init__(self, latency=None, error_429_rate=0.0, error_503_rate=0.0, retry_after=1.0,
+                 requests_per_minute=None, canned_outputs=None, seed=None):
+        self.latency = latency or LatencyModel()
+        self.error_429_rate = error_429_rate
+        self.error_503_rate = error_503_rate
+        self.retry_after = retry_after
+        self.requests_per_minute = requests_per_minute
+        self.canned_outputs = canned_outputs
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "503": 0, "404": 0}
+        self._random = random.Random(seed)
+        self._window = []
+        self._lock = threading.Lock()
+
+    # Decide the fate of one request: None (answer it), 429 or 503
+    def draw_error(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.requests_per_minute:
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 60]
+                if len(self._window) >= self.requests_per_minute:
+                    return 429
+                self._window.append(now)
+            roll = self._random.random()
+        if roll < self.error_429_rate:
+            return 429
+        if roll < self.error_429_rate + self.error_503_rate:
+            return 503
+        return None
+
+    def count(self, status):
+        with self._lock:
+            self.stats[status] = self.stats.get(status, 0) + 1
+
+    # The answer to a prompt: a canned output (the same prompt always gets the same one) or
+    # a generated structured summary
+    def output(self, text, methods_label="Methods and Techniques"):
+        if self.canned_outputs:
+            index = int(hashlib.sha1(text.encode("utf-8")).hexdigest(), 16) % len(self.canned_outputs)
+            return self.canned_outputs[index]
+        return canned_summary(text, methods_label)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this, Nagle's algorithm adds ~40ms per response
+    disable_nagle_algorithm = True
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, body, headers=None, count=True):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        if count:
+            self.server.config.count("ok" if status == 200 else str(status))
+
+    # Answer a chat completion as server-sent events, one chunk per word, as with stream=True
+    def _send_stream(self, request, content, usage):
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "mock")}
+        words = content.split(" ")
+        chunks = [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}
+                  for i, word in enumerate(words)]
+        chunks.append({"index": 0, "delta": {}, "finish_reason": "stop"})
+        events = [dict(base, choices=[choice]) for choice in chunks]
+        if (request.get("stream_options") or {}).get("include_usage"):
+            events.append(dict(base, choices=[], usage=usage))
+        data = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        data = data.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.config.count("ok")
+
+    def _send_error(self, status, hf):
+        config = self.server.config
+        headers = {"Retry-After": f"{config.retry_after:g}"} if status == 429 else {}
+        if hf:
+            message = "Rate limit reached" if status == 429 else "Model is currently loading"
+            body = {"error": message}
+            if status == 503:
+                body["estimated_time"] = config.retry_after
+        else:
+            error_type = "rate_limit_exceeded" if status == 429 else "service_unavailable"
+            body = {"error": {"message": f"Mock {status}", "type": error_type, "code": error_type}}
+        self._send_json(status, body, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.server.config._lock:
+                stats = dict(self.server.config.stats)
+            self._send_json(200, stats, count=False)
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        config = self.server.config
+        request = self._read_json()
+        chat = self.path.rstrip("/").endswith("/chat/completions")
+        hf = self.path.startswith("/models/")
+        if not chat and not hf:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        time.sleep(config.latency.sample())
+        error = config.draw_error()
+        if error is not None:
+            self._send_error(error, hf)
+        elif chat:
+            prompt = request.get("messages", [{}])[-1].get("content", "")
+            content = config.output(prompt)
+            completion_tokens = len(content) // 4
+            prompt_tokens = sum(len(message.get("content", "")) for message in request.get("messages", [])) // 4
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            if request.get("stream"):
+                self._send_stream(request, content, usage)
+                return
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+        else:
+            inputs = request.get("inputs", "")
+            texts = inputs if isinstance(inputs, list) else [inputs]
+            self._send_json(200, [{"summary_text": config.output(text, "Methods_Techniques")} for text in texts])
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to start the mock server in a background thread; returns (server, base_url).
+# Port 0 picks a free port. Without a config the server answers at once and never fails.
+def start_mock_server(host="127.0.0.1", port=0, config=None):
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.config = config or MockConfig()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI and Hugging Face Inference APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response delay, in seconds")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed", help="Distribution of the delay")
+    parser.add_argument("--latency-spread", type=float, default=0.0,
+                        help="Half-width (uniform), standard deviation (normal) or log sigma (lognormal) of the delay")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Share of requests answered with 429 Too Many Requests")
+    parser.add_argument("--error-503", type=float, default=0.0, help="Share of requests answered with 503 (model loading)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After / estimated_time sent with the errors, in seconds")
+    parser.add_argument("--rpm", type=int, help="Answer 429 above this many requests per minute")
+    parser.add_argument("--canned", help="JSON file with a list of outputs to answer with instead of the generated summaries")
+    parser.add_argument("--seed", type=int, help="Seed of the latency and error draws")
+    args = parser.parse_args(argv)
+
+    canned_outputs = None
+    if args.canned:
+        with open(args.canned) as file:
+            canned_outputs = json.load(file)
+    config = MockConfig(
+        latency=LatencyModel(args.latency_dist, args.latency, args.latency_spread, seed=args.seed),
+        error_429_rate=args.error_429, error_503_rate=args.error_503, retry_after=args.retry_after,
+        requests_per_minute=args.rpm, canned_outputs=canned_outputs, seed=args.seed,
+    )
+    server, base_url = start_mock_server(args.host, args.port, config)
+    print(f"Mock API listening on {base_url} (OpenAI base URL: {base_url}/v1)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
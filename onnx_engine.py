@@ -0,0 +1,77 @@
+import os
+import shutil
+import time
+from precision import cpu_flags, resolve_precision
+
+# Inference engines of the seq2seq summarizers: eager PyTorch or ONNX Runtime (CPU)
+ENGINES = ["torch", "onnx"]
+# Where the exported (and quantized) ONNX graphs are kept between runs
+DEFAULT_EXPORT_DIR = os.environ.get("ABSTRACT_ONNX_DIR", ".onnx_models")
+# Graphs of an encoder-decoder export: encoder, decoder and decoder-with-past
+SEQ2SEQ_FILES = ["encoder_model.onnx", "decoder_model.onnx", "decoder_with_past_model.onnx"]
+
+
+# Function to pick the precision of the ONNX graphs: int8 when the selected precision
+# resolves to int8 on the CPU, fp32 otherwise (ONNX Runtime has no fast bf16 CPU kernels)
+def onnx_precision():
+    return "int8" if resolve_precision("cpu") == "int8" else "fp32"
+
+
+def _export_path(model_name, precision, export_dir):
+    return os.path.join(export_dir, f"{model_name.replace('/', '--')}-{precision}")
+
+
+def _size_mib(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.endswith(".onnx")) / 2**20
+
+
+# Function to export a seq2seq model to ONNX once and keep the graphs on disk
+def _export(model_name, export_dir):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    path = _export_path(model_name, "fp32", export_dir)
+    if not os.path.exists(os.path.join(path, SEQ2SEQ_FILES[0])):
+        print(f"Exporting {model_name} to ONNX in {path} (only once)...")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+        model.save_pretrained(path)
+    return path
+
+
+# Function to quantize the exported graphs to int8 once (dynamic quantization, CPU)
+def _quantize(model_name, fp32_path, export_dir):
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    path = _export_path(model_name, "int8", export_dir)
+    quantized_files = [name.replace(".onnx", "_quantized.onnx") for name in SEQ2SEQ_FILES]
+    if not all(os.path.exists(os.path.join(path, name)) for name in quantized_files):
+        print(f"Quantizing the ONNX graphs of {model_name} to int8 in {path} (only once)...")
+        # VNNI instructions speed up int8 matmuls where available
+        if "avx512_vnni" in cpu_flags():
+            config = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        else:
+            config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        for name in SEQ2SEQ_FILES:
+            ORTQuantizer.from_pretrained(fp32_path, file_name=name).quantize(save_dir=path, quantization_config=config)
+        # The quantized graphs load with the configuration of the export
+        for name in os.listdir(fp32_path):
+            if name.endswith(".json"):
+                shutil.copy(os.path.join(fp32_path, name), path)
+    return path, quantized_files
+
+
+# Function to load a seq2seq model (BART, T5) as ONNX Runtime graphs, exporting and
+# quantizing it on first use. The model has the same generate() as the PyTorch one.
+def load_onnx_model(model_name, export_dir=DEFAULT_EXPORT_DIR):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    precision = onnx_precision()
+    start = time.perf_counter()
+    path = _export(model_name, export_dir)
+    if precision == "int8":
+        path, (encoder, decoder, decoder_with_past) = _quantize(model_name, path, export_dir)
+        model = ORTModelForSeq2SeqLM.from_pretrained(
+            path, encoder_file_name=encoder, decoder_file_name=decoder, decoder_with_past_file_name=decoder_with_past
+        )
+    else:
+        model = ORTModelForSeq2SeqLM.from_pretrained(path)
+    print(f"Loaded {model_name} with ONNX Runtime in {precision} on cpu: "
+          f"{_size_mib(path):.0f} MiB of graphs, {time.perf_counter() - start:.1f}s")
+    return model
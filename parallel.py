@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+import time
+from llm_cache import reset_cache_after_fork
+from metrics import disable_metrics, get_metrics
+
+# Generation function of the worker processes (inherited through fork)
+_summarize = None
+
+
+# Function to list the cores this process may run on
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# Set up one worker process: its own cache connection, no metrics (the parent reports),
+# a fixed number of PyTorch threads and, where supported, its own block of cores so the
+# workers do not compete for the same ones
+def _init_worker(summarize, threads, counter, pin):
+    global _summarize
+    import torch
+    _summarize = summarize
+    reset_cache_after_fork()
+    disable_metrics()
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    cores = available_cores()[index * threads:(index + 1) * threads]
+    if pin and len(cores) == threads and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+
+
+def _run(abstract):
+    start = time.perf_counter()
+    try:
+        summary = _summarize(abstract)
+    except Exception as e:
+        print(f"Error processing abstract: {e}")
+        summary = None
+    return abstract, summary, time.perf_counter() - start
+
+
+# Function to process abstracts data-parallel on the CPU: `workers` processes, each with
+# `threads` PyTorch threads (by default the cores split evenly), take abstracts from a
+# shared queue and run `summarize` on them. Results are gathered and written in input
+# order. `load` is called once in this process before the workers are forked, so they
+# share the model weights copy-on-write instead of loading one copy each.
+def process_abstracts_parallel(abstracts, sink, summarize, build_row, parse=None, workers=2, threads=None,
+                               load=None, pin=True):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("Data-parallel mode needs the fork start method (Linux)")
+    threads = threads or max(1, len(available_cores()) // workers)
+    if load is not None:
+        load()
+    import torch
+    if torch.cuda.is_initialized():
+        raise RuntimeError("Data-parallel mode runs on the CPU: CUDA cannot be used from forked workers")
+
+    context = multiprocessing.get_context("fork")
+    counter = context.Value("i", 0)
+    metrics = get_metrics()
+    processed = 0
+    run_start = time.perf_counter()
+    print(f"Starting {workers} worker processes with {threads} threads each")
+    with context.Pool(workers, initializer=_init_worker, initargs=(summarize, threads, counter, pin)) as pool:
+        for abstract, summary, latency in pool.imap(_run, abstracts):
+            if summary:
+                with metrics.stage("parse"):
+                    data = parse(summary) if parse else summary
+                sink.write(abstract, build_row(data, latency))  # Buffered; flushed in batches
+            else:
+                print(f"Skipping abstract due to error: {abstract[:60]}...")
+                metrics.count("errors")
+            processed += 1
+            metrics.item_done()
+
+    if processed:
+        elapsed = time.perf_counter() - run_start
+        print(f"{processed} abstracts in {elapsed:.1f}s ({processed / elapsed:.2f} abstracts/s)")
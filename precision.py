@@ -0,0 +1,114 @@
+import os
+import time
+
+# Numeric precision of the local models:
+#   fp32 - full precision, the reference output
+#   bf16 - bfloat16 weights and activations; fast only on GPUs and CPUs with native bf16 (AVX512-BF16/AMX)
+#   int8 - dynamic int8 quantization of the Linear layers (CPU only), ~4x smaller and usually the fastest CPU mode
+#   auto - bf16 where the hardware supports it natively, otherwise fp32; int8 changes the generated
+#          text, so it is only used when asked for explicitly
+PRECISIONS = ["auto", "fp32", "bf16", "int8"]
+
+_requested = os.environ.get("ABSTRACT_PRECISION", "auto")
+_resolved = {}
+
+
+# Function to select the precision of the local models loaded from now on
+def set_precision(mode):
+    global _requested
+    if mode not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{mode}', expected one of {', '.join(PRECISIONS)}")
+    _requested = mode
+    _resolved.clear()
+
+
+# Function to pick the device of a local model: the GPU if available, otherwise the CPU
+def default_device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+# Function to read the CPU feature flags (empty where /proc/cpuinfo is not available)
+def cpu_flags():
+    try:
+        with open("/proc/cpuinfo") as file:
+            return set(file.read().split())
+    except OSError:
+        return set()
+
+
+# Function to check whether the CPU computes bfloat16 natively (otherwise bf16 is emulated and slow)
+def cpu_supports_bf16():
+    return bool(cpu_flags() & {"avx512_bf16", "amx_bf16"})
+
+
+# Function to resolve the requested precision into the concrete mode used on `device`
+def resolve_precision(device="cpu"):
+    if device in _resolved:
+        return _resolved[device]
+
+    mode = _requested
+    if device == "cpu":
+        if mode == "auto":
+            mode = "bf16" if cpu_supports_bf16() else "fp32"
+        elif mode == "bf16" and not cpu_supports_bf16():
+            print("Precision: this CPU has no native bf16, falling back to fp32.")
+            mode = "fp32"
+    else:
+        if mode == "auto":
+            import torch
+            mode = "bf16" if torch.cuda.is_bf16_supported() else "fp32"
+        elif mode == "int8":
+            raise ValueError("int8 dynamic quantization runs on the CPU only; use fp32 or bf16 on the GPU")
+
+    _resolved[device] = mode
+    return mode
+
+
+# GPT-2 stores its projections in transformers' Conv1D (a transposed Linear), which dynamic
+# quantization does not recognize; swap them for equivalent nn.Linear layers first
+def _conv1d_to_linear(model):
+    import torch
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if type(child).__name__ != "Conv1D":
+                continue
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(parent, name, linear)
+    return model
+
+
+# Function to compute the size of a model's weights in bytes (quantized weights count 1 byte each)
+def model_size_bytes(model):
+    import torch
+
+    def size(value):
+        if isinstance(value, torch.Tensor):
+            return value.nelement() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(size(item) for item in value)
+        return 0
+
+    return sum(size(value) for value in model.state_dict().values())
+
+
+# Function to load a pretrained model in the selected precision and move it to `device`.
+# Prints the load time and the weight memory so the modes can be compared.
+def load_pretrained(model_class, model_name, device="cpu", **kwargs):
+    import torch
+    mode = resolve_precision(device)
+    start = time.perf_counter()
+    if mode == "bf16":
+        kwargs["torch_dtype"] = torch.bfloat16
+    elif "torch_dtype" not in kwargs:
+        kwargs["torch_dtype"] = torch.float32
+    model = model_class.from_pretrained(model_name, **kwargs)
+    if mode == "int8":
+        model = torch.ao.quantization.quantize_dynamic(_conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+    model = model.to(device).eval()
+    print(f"Loaded {model_name} in {mode} on {device}: "
+          f"{model_size_bytes(model) / 2**20:.0f} MiB of weights, {time.perf_counter() - start:.1f}s")
+    return model
@@ -0,0 +1,39 @@
+import copy
+
+
+# Attention states (past_key_values) of a fixed prompt header, computed once and reused
+# by every generation whose prompt starts with it, so only the per-abstract tokens are
+# prefilled. Each generation starts from its own copy of the cached states.
+class PrefixCache:
+    def __init__(self, model, tokenizer, prefix, device="cpu"):
+        import torch
+        self.model = model
+        self.prefix_ids = tokenizer(prefix, return_tensors="pt")["input_ids"].to(device)
+        with torch.no_grad():
+            self.past_key_values = model(self.prefix_ids, use_cache=True).past_key_values
+        self.hits = 0
+        self.misses = 0
+
+    def _matches(self, input_ids, num_beams):
+        import torch
+        length = self.prefix_ids.shape[1]
+        # Beam search expands the batch, which the single cached state cannot follow
+        return (
+            num_beams == 1
+            and input_ids.shape[0] == 1
+            and input_ids.shape[1] > length
+            and torch.equal(input_ids[:, :length], self.prefix_ids)
+        )
+
+    # Function to generate like model.generate, starting from the cached prefix when the
+    # tokenized prompt begins with it (otherwise the whole prompt is prefilled as usual)
+    def generate(self, input_ids, **kwargs):
+        if not self._matches(input_ids, kwargs.get("num_beams", 1)):
+            self.misses += 1
+            return self.model.generate(input_ids, **kwargs)
+        self.hits += 1
+        return self.model.generate(input_ids, past_key_values=copy.deepcopy(self.past_key_values), **kwargs)
+
+    def stats(self):
+        return (f"Prefix cache: {self.prefix_ids.shape[1]} prompt tokens reused in {self.hits} generations "
+                f"({self.misses} without the prefix)")
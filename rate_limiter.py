@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+# Rough characters-per-token ratio for English text with the OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+# Function to estimate the number of tokens in a prompt without a tokenizer
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+_encodings = {}
+
+
+# Function to count the tokens of a text with the model's tokenizer (tiktoken), falling
+# back to the estimate when tiktoken is not installed or does not know the model
+def count_tokens(text, model="gpt-4-turbo"):
+    if model not in _encodings:
+        try:
+            import tiktoken
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except (ImportError, KeyError):
+            _encodings[model] = None
+    encoding = _encodings[model]
+    return len(encoding.encode(text)) if encoding is not None else estimate_tokens(text)
+
+
+# Token bucket that refills continuously up to its capacity
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.level = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    # Seconds to wait before `amount` can be consumed (0 if available now). More than the
+    # bucket can ever hold would wait forever, so it is rejected.
+    def wait_time(self, amount):
+        if amount > self.capacity:
+            raise ValueError(f"A request of {amount:.0f} exceeds the limit of {self.capacity:.0f} per minute: split it")
+        self._refill()
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_second
+
+    def consume(self, amount):
+        self._refill()
+        self.level -= amount
+
+    # Correct the level once the real cost is known (may go negative to repay a debt)
+    def adjust(self, delta):
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+
+# Requests-per-minute and tokens-per-minute limiter, usable from asyncio and from threads
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0) if tokens_per_minute else None
+        self._thread_lock = threading.Lock()
+        self._async_lock = None
+
+    # Largest number of tokens one request may use (None without a token limit)
+    def max_request_tokens(self):
+        return int(self.tokens.capacity) if self.tokens else None
+
+    def _wait_time(self, tokens):
+        delay = 0.0
+        if self.requests:
+            delay = max(delay, self.requests.wait_time(1))
+        if self.tokens and tokens:
+            delay = max(delay, self.tokens.wait_time(tokens))
+        return delay
+
+    def _consume(self, tokens):
+        if self.requests:
+            self.requests.consume(1)
+        if self.tokens and tokens:
+            self.tokens.consume(tokens)
+
+    # Wait (asynchronously) until one request of `tokens` estimated tokens is allowed
+    async def acquire(self, tokens=0):
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            while True:
+                with self._thread_lock:
+                    delay = self._wait_time(tokens)
+                    if delay <= 0:
+                        self._consume(tokens)
+                        return
+                await asyncio.sleep(delay)
+
+    # Blocking variant of acquire for the synchronous scripts
+    def wait(self, tokens=0):
+        while True:
+            with self._thread_lock:
+                delay = self._wait_time(tokens)
+                if delay <= 0:
+                    self._consume(tokens)
+                    return
+            time.sleep(delay)
+
+    # Report the real token usage of a request that was admitted with an estimate
+    def record_usage(self, estimated_tokens, actual_tokens):
+        if self.tokens and actual_tokens is not None:
+            with self._thread_lock:
+                self.tokens.adjust(actual_tokens - estimated_tokens)
@@ -0,0 +1,154 @@
+import csv
+import glob
+import os
+import shutil
+import time
+from journal import Journal, abstract_id, repair_csv
+from metrics import get_metrics
+
+# The five fields extracted from every abstract
+FIELDS = ["Objectives", "Problem", "Data", "Methods_Techniques", "Results"]
+# Provenance columns stored in front of the extracted fields
+META_COLUMNS = ["abstract_id", "backend", "model", "latency_s"]
+COLUMNS = META_COLUMNS + FIELDS
+# Columns of the scripts that only extract the problem
+PROBLEM_COLUMNS = META_COLUMNS + ["Problem"]
+
+
+# Buffered result writer: rows are kept in memory and written in batches when
+# `flush_rows` rows are pending or `flush_seconds` have passed. Each abstract is
+# journaled only after its row has been written, so --resume stays consistent.
+class ResultSink:
+    def __init__(self, output_filename, journal, columns=COLUMNS, flush_rows=50, flush_seconds=10.0):
+        self.output_filename = output_filename
+        self.journal = journal
+        self.columns = columns
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._rows = []
+        self._abstracts = []
+        self._last_flush = time.monotonic()
+
+    # Buffer the result of one abstract; missing fields are stored as 'N/A'
+    def write(self, abstract_text, row):
+        row = dict(row, abstract_id=abstract_id(abstract_text))
+        self._rows.append([row.get(column, 'N/A') for column in self.columns])
+        self._abstracts.append(abstract_text)
+        if len(self._rows) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            with get_metrics().stage("write"):
+                self._write_rows(self._rows)
+            for abstract in self._abstracts:
+                self.journal.mark_done(abstract)
+        self._rows = []
+        self._abstracts = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.journal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+# CSV output: one append per flush instead of one per abstract
+class CSVSink(ResultSink):
+    def start(self):
+        with open(self.output_filename, mode='w', newline='') as file:
+            csv.writer(file).writerow(self.columns)
+
+    def repair(self):
+        repair_csv(self.output_filename, self.journal.rows)
+
+    def _write_rows(self, rows):
+        with open(self.output_filename, mode='a', newline='') as file:
+            csv.writer(file).writerows(rows)
+
+
+# Parquet output: a directory of part files, one complete file per flush, so a
+# crash never leaves a half-written footer behind and a resumed run just adds parts
+class ParquetSink(ResultSink):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schema = pyarrow.schema([
+            (column, pyarrow.float64() if column == "latency_s" else pyarrow.string()) for column in self.columns
+        ])
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.output_filename, "part-*.parquet")))
+
+    def start(self):
+        if os.path.isfile(self.output_filename):
+            # A single-file export (e.g. from pandas) at the output path is replaced, like a CSV output
+            print(f"Replacing the file {self.output_filename} with a directory of Parquet parts.")
+            os.remove(self.output_filename)
+        shutil.rmtree(self.output_filename, ignore_errors=True)
+        os.makedirs(self.output_filename)
+
+    def repair(self):
+        # A part is journaled row by row after it is written, so a crash can leave a part
+        # with only some of its rows journaled. Those rows are kept (their abstracts are
+        # skipped on resume) and the part is rewritten without the others.
+        for part in self._parts():
+            ids = self._pq.read_table(part, columns=["abstract_id"]).column("abstract_id").to_pylist()
+            journaled = [identifier in self.journal.completed for identifier in ids]
+            if all(journaled):
+                continue
+            kept = sum(journaled)
+            print(f"Repairing {self.output_filename}: keeping {kept} of {len(ids)} rows of {os.path.basename(part)}.")
+            if kept:
+                table = self._pq.read_table(part).filter(self._pa.array(journaled))
+                self._pq.write_table(table, part + ".tmp")
+                os.replace(part + ".tmp", part)
+            else:
+                os.remove(part)
+
+    def _write_rows(self, rows):
+        table = self._pa.Table.from_pylist([dict(zip(self.columns, row)) for row in rows], schema=self._schema)
+        parts = self._parts()
+        index = int(os.path.basename(parts[-1])[5:10]) + 1 if parts else 0
+        path = os.path.join(self.output_filename, f"part-{index:05d}.parquet")
+        self._pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+# Function to open the result sink of a run; the format follows the file extension.
+# Without `resume` (or without a previous output) the output is started over;
+# with `resume` the completed rows are kept and the journal tells what to skip.
+def open_sink(output_filename, columns=COLUMNS, resume=False, **kwargs):
+    sink_class = ParquetSink if output_filename.endswith(".parquet") else CSVSink
+    sink = sink_class(output_filename, Journal(output_filename), columns, **kwargs)
+    # Only a directory of parts can be resumed as Parquet output
+    if sink_class is ParquetSink:
+        resumable = os.path.isdir(output_filename)
+    else:
+        resumable = os.path.exists(output_filename) and os.path.getsize(output_filename) > 0
+    if resume and resumable:
+        sink.repair()
+        print(f"Resuming: {len(sink.journal.completed)} abstracts already processed.")
+    else:
+        sink.journal.reset()
+        sink.start()
+    return sink
+
+
+# Function to load only the needed columns of a result file (CSV or Parquet)
+def read_results(path, columns=None):
+    import pandas as pd
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
@@ -1,24 +1,104 @@
-import openai
-import csv
+import argparse
+import asyncio
+import os
 import time
-import config
+from collections import deque
+from dedup import DEFAULT_THRESHOLD, DuplicateFanOut, find_near_duplicates
+from llm_cache import endpoint_backend, get_cache, set_cache_enabled
+from loader import count_abstracts, load_abstracts, parse_shard
+from metrics import add_metrics_arguments, configure_metrics, get_metrics
+from result_sink import open_sink
+from rate_limiter import RateLimiter, estimate_tokens
+from section_parser import SectionStream, parse_sections
 
-# Set up the OpenAI API key
-openai.api_key = config.OPENAI_KEY
+# Set up the OpenAI API key (on first use, so importing this module does not require config.py).
+# OPENAI_API_KEY and OPENAI_BASE_URL, when set, take precedence (e.g. to target a local mock server).
+def configure_openai():
+    import openai
+    if openai.api_key is None:
+        if os.environ.get("OPENAI_API_KEY"):
+            openai.api_key = os.environ["OPENAI_API_KEY"]
+        else:
+            import config
+            openai.api_key = config.OPENAI_KEY
+    return openai.api_key
+
+# Model and rate limits used for the extraction
+MODEL_NAME = "gpt-4-turbo"  # Use GPT-4-turbo for cost savings
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 30000
+# Expected completion size, used to reserve tokens before the real usage is known
+EXPECTED_COMPLETION_TOKENS = 300
+# Backend name in the response cache (separate for a custom OPENAI_BASE_URL)
+CACHE_BACKEND = endpoint_backend("openai", os.environ.get("OPENAI_BASE_URL"))
+
+# Build the chat messages for one abstract
+def build_messages(abstract_text):
+    return [
+        {"role": "system", "content": "You are an expert summarizer."},
+        {"role": "user", "content": f"Summarize the following abstract: {abstract_text}"}
+    ]
+
+# Function to read a streamed completion, printing each field as soon as it is complete;
+# returns the full text and the token usage (sent in the last chunk)
+def read_stream(response):
+    parser = SectionStream()
+    chunks = []
+    usage = None
+    start = time.perf_counter()
+    for chunk in response:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content or ""
+        chunks.append(text)
+        for field, value in parser.feed(text):
+            print(f"  {field} (+{time.perf_counter() - start:.2f}s): {value}")
+    for field, value in parser.close():
+        print(f"  {field} (+{time.perf_counter() - start:.2f}s): {value}")
+    return "".join(chunks), usage
+
+# Function to call the OpenAI API using GPT-4-turbo. With `stream`, the answer is
+# streamed and its fields are shown as soon as each one is complete.
+def get_abstract_summary(abstract_text, limiter=None, stream=False):
+    messages = build_messages(abstract_text)
+
+    def request_summary():
+        # Only calls that miss the cache count against the rate limits
+        metrics = get_metrics()
+        estimated_tokens = estimate_tokens(abstract_text) + EXPECTED_COMPLETION_TOKENS
+        if limiter is not None:
+            with metrics.stage("rate_limit"):
+                limiter.wait(estimated_tokens)
+        import openai
+        configure_openai()
+        with metrics.stage("request"):
+            if stream:
+                content, usage = read_stream(openai.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                ))
+            else:
+                response = openai.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=messages,
+                    # max_tokens=300  # Adjust based on the size of your abstracts
+                )
+                # Correct way to access the content from the response
+                content, usage = response.choices[0].message.content, response.usage
+        # Give back (or charge) the difference between the estimate and the real usage
+        if usage is not None:
+            if limiter is not None:
+                limiter.record_usage(estimated_tokens, usage.total_tokens)
+            metrics.count("tokens_in", usage.prompt_tokens)
+            metrics.count("tokens_out", usage.completion_tokens)
+        return content
 
-# Function to call the OpenAI API using GPT-4-turbo
-def get_abstract_summary(abstract_text):
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4-turbo",  # Use GPT-4-turbo for cost savings
-            messages=[
-                {"role": "system", "content": "You are an expert summarizer."},
-                {"role": "user", "content": f"Summarize the following abstract: {abstract_text}"}
-            ],
-            # max_tokens=300  # Adjust based on the size of your abstracts
-        )
-        # Correct way to access the content from the response
-        summary_text = response['choices'][0]['message']['content']
+        summary_text = get_cache().cached(CACHE_BACKEND, MODEL_NAME, messages, {}, request_summary)
 
         # Log the response to understand its structure
         print("Raw API response:")
@@ -29,71 +109,163 @@ def get_abstract_summary(abstract_text):
         print(f"Error processing abstract: {e}")
         return None  # Return None if there's an error
 
-# Function to parse the content into a dictionary
+# Function to parse the content into a dictionary (see section_parser.py)
 def parse_analysis(analysis_text):
-    # Log the raw response to see what's returned
-    print("Raw API response for analysis:")
-    print(analysis_text)
-
-    sections = ['Objectives', 'Problem', 'Data', 'Methods and Techniques', 'Results']
-    parsed_data = {}
+    parsed_data = parse_sections(analysis_text)
 
-    # Split the text into lines
-    lines = analysis_text.split('\n')
-    
-    current_section = None
-    for line in lines:
-        for section in sections:
-            if line.startswith(section):
-                current_section = section
-                parsed_data[section] = line.replace(f"{section}:", "").strip()
-                break
-        else:
-            if current_section:
-                parsed_data[current_section] += " " + line.strip()
-    
     # Log parsed data to verify if it's correct
     print("Parsed data:")
     print(parsed_data)
     
     return parsed_data
 
-# Function to append the output to a CSV file immediately after each abstract
-def append_to_csv(data, output_filename="processed_abstracts.csv"):
-    with open(output_filename, mode='a', newline='') as file:  # 'a' for append mode
-        writer = csv.writer(file)
-        writer.writerow([data.get('Objectives', 'N/A'), data.get('Problem', 'N/A'), data.get('Data', 'N/A'),
-                         data.get('Methods and Techniques', 'N/A'), data.get('Results', 'N/A')])
+# Function to build the output row of one abstract, with the call's provenance
+def build_row(data, latency):
+    return {
+        "backend": "openai", "model": MODEL_NAME, "latency_s": round(latency, 3),
+        "Objectives": data.get('Objectives', 'N/A'), "Problem": data.get('Problem', 'N/A'), "Data": data.get('Data', 'N/A'),
+        "Methods_Techniques": data.get('Methods_Techniques', 'N/A'), "Results": data.get('Results', 'N/A')
+    }
 
 # Function to process abstracts
-def process_abstracts(abstracts, output_filename="processed_abstracts.csv"):
+def process_abstracts(abstracts, sink, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE, stream=False):
+    # Rate limiter instead of a fixed delay to prevent overwhelming the API
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
     for abstract in abstracts:
         print(f"Processing abstract: {abstract[:60]}...")  # Show part of the abstract for tracking
-        summary = get_abstract_summary(abstract)
+        start = time.perf_counter()
+        summary = get_abstract_summary(abstract, limiter, stream)
+        latency = time.perf_counter() - start
         if summary:
-            parsed_data = parse_analysis(summary)
-            append_to_csv(parsed_data, output_filename)  # Save immediately after processing
-            time.sleep(1)  # Add a short delay to prevent overwhelming the API
+            with get_metrics().stage("parse"):
+                parsed_data = parse_analysis(summary)
+            sink.write(abstract, build_row(parsed_data, latency))  # Buffered; flushed in batches
         else:
             print("Skipping abstract due to error.")
+            get_metrics().count("errors")
+        get_metrics().item_done()
+
+# Async version of get_abstract_summary, admitted by the shared rate limiter
+async def get_abstract_summary_async(client, abstract_text, limiter):
+    messages = build_messages(abstract_text)
+
+    async def request_summary():
+        metrics = get_metrics()
+        estimated_tokens = estimate_tokens(abstract_text) + EXPECTED_COMPLETION_TOKENS
+        with metrics.stage("rate_limit"):
+            await limiter.acquire(estimated_tokens)
+        with metrics.stage("request"):
+            response = await client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages,
+            )
+        # Give back (or charge) the difference between the estimate and the real usage
+        if response.usage is not None:
+            limiter.record_usage(estimated_tokens, response.usage.total_tokens)
+            metrics.count("tokens_in", response.usage.prompt_tokens)
+            metrics.count("tokens_out", response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    try:
+        return await get_cache().cached_async(CACHE_BACKEND, MODEL_NAME, messages, {}, request_summary)
+    except Exception as e:
+        print(f"Error processing abstract: {e}")
+        return None
+
+# Function to process abstracts concurrently, writing the results in input order
+async def process_abstracts_async(abstracts, sink, max_concurrency=8, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+    import openai
+    client = openai.AsyncOpenAI(api_key=configure_openai())
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def worker(abstract):
+        async with semaphore:
+            start = time.perf_counter()
+            summary = await get_abstract_summary_async(client, abstract, limiter)
+            return summary, time.perf_counter() - start
+
+    # Keep a bounded window of scheduled requests so large inputs are not all queued at once
+    pending = deque()
+
+    def write_result(abstract, result):
+        summary, latency = result
+        if summary:
+            with get_metrics().stage("parse"):
+                parsed_data = parse_analysis(summary)
+            sink.write(abstract, build_row(parsed_data, latency))
+        else:
+            print(f"Skipping abstract due to error: {abstract[:60]}...")
+            get_metrics().count("errors")
+        get_metrics().item_done()
+
+    try:
+        for abstract in abstracts:
+            print(f"Processing abstract: {abstract[:60]}...")  # Show part of the abstract for tracking
+            pending.append((abstract, asyncio.create_task(worker(abstract))))
+            # Results are written strictly in input order: wait for the oldest request first
+            while len(pending) >= max_concurrency * 4:
+                abstract_done, task = pending.popleft()
+                write_result(abstract_done, await task)
 
-# Load abstracts from file
-def load_abstracts_from_file(file_path):
-    with open(file_path, 'r') as file:
-        return file.readlines()  # Assumes each line is a new abstract
+        while pending:
+            abstract_done, task = pending.popleft()
+            write_result(abstract_done, await task)
+    finally:
+        for _, task in pending:
+            task.cancel()
+        await client.close()
 
 # Main function to execute the process
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract structured fields from abstracts with the OpenAI API.")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Send several requests concurrently instead of one at a time")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight in async mode")
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE, help="Requests-per-minute limit")
+    parser.add_argument("--tpm", type=int, default=TOKENS_PER_MINUTE, help="Tokens-per-minute limit")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the answers and show each field as soon as it is complete (sequential mode)")
+    parser.add_argument("--dedup", type=float, nargs="?", const=DEFAULT_THRESHOLD, metavar="JACCARD",
+                        help="Extract only one abstract per cluster of near-duplicates (MinHash/LSH, default similarity "
+                             f"{DEFAULT_THRESHOLD}) and copy its row to the others")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache and always call the API")
+    parser.add_argument("--input", default="abstracts_list.txt", help="Abstracts file, one abstract per line")
+    parser.add_argument("--output", default="processed_abstracts.csv",
+                        help="Output file; use a .parquet name for a Parquet dataset instead of CSV")
+    parser.add_argument("--shard", type=parse_shard, help="Process only slice i of N of the input (e.g. 0/4), to split the work across processes")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted run, skipping the abstracts already processed")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.stream and args.use_async:
+        parser.error("--stream is only available in sequential mode")
+    metrics = configure_metrics(args, "run")
+    set_cache_enabled(not args.no_cache)
+
     # Load your abstracts (adjust file path as needed)
-    abstracts = load_abstracts_from_file('abstracts_list.txt')
+    abstracts = load_abstracts(args.input, shard=args.shard)
     
-    # Initialize the CSV file with headers
-    with open('processed_abstracts.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Objectives", "Problem", "Data", "Methods_Techniques", "Results"])
+    # Initialize the output with headers (keeping the completed rows when resuming)
+    with open_sink(args.output, resume=args.resume) as sink:
+        # Skip the abstracts already processed by a previous run
+        abstracts = sink.journal.pending(abstracts)
+        metrics.set_total(lambda: count_abstracts(args.input, args.shard, sink.journal))
+        output = sink
+        if args.dedup:
+            # Near-duplicates are not sent for extraction: they get the row of their representative
+            abstracts, duplicates = find_near_duplicates(abstracts, args.dedup)
+            output = DuplicateFanOut(sink, duplicates)
+
+        # Process the abstracts and append to the output
+        if args.use_async:
+            asyncio.run(process_abstracts_async(abstracts, output, max_concurrency=args.concurrency,
+                                                requests_per_minute=args.rpm, tokens_per_minute=args.tpm))
+        else:
+            process_abstracts(abstracts, output, requests_per_minute=args.rpm, tokens_per_minute=args.tpm, stream=args.stream)
+
+    print(f"Response cache: {get_cache().stats()}")
 
-    # Process the abstracts and append to CSV
-    process_abstracts(abstracts)
+    metrics.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,156 @@
+import re
+
+# Output fields of a structured summary (the result columns)
+SECTION_FIELDS = ["Objectives", "Problem", "Data", "Methods_Techniques", "Results"]
+# Labels the models use for each field, matched case-insensitively
+SECTION_LABELS = {
+    "Objectives": ["Objectives", "Objective", "Aims", "Aim", "Goals", "Goal"],
+    "Problem": ["Problem", "Problems", "Problem Statement", "Research Problem"],
+    "Data": ["Data", "Dataset", "Datasets", "Data Sources"],
+    "Methods_Techniques": ["Methods and Techniques", "Methods & Techniques", "Methods/Techniques", "Methods_Techniques",
+                           "Methods", "Techniques", "Methodology"],
+    "Results": ["Results", "Result", "Findings", "Main Results"],
+}
+MISSING = "N/A"
+
+
+def _normalize_label(label):
+    return re.sub(r"[\s_]+", " ", label.strip().lower())
+
+
+_FIELD_OF_LABEL = {_normalize_label(label): field for field, labels in SECTION_LABELS.items() for label in labels}
+
+# One label line: an optional bullet, number or markdown heading, the label (optionally in
+# bold), then either a separator (a colon or a spaced dash) and the start of the text, or
+# the end of the line. The word boundary after the label keeps "Data" from matching
+# "Database", and a label followed by prose without a separator ("Results show that ...")
+# is not a label line.
+_BOLD = r"(?:\*\*|__)?"
+_LABEL_LINE = re.compile(
+    r"^[ \t]*" + _BOLD + r"[ \t]*(?:[-*+•][ \t]+|\d+[.)][ \t]*|#{1,6}[ \t]*)?" + _BOLD + r"[ \t]*"
+    r"(?P<label>" + "|".join(
+        re.escape(label).replace(r"\ ", r"[ \t_]+")
+        for label in sorted(_FIELD_OF_LABEL, key=len, reverse=True)
+    ) + r")\b[ \t]*" + _BOLD + r"[ \t]*"
+    r"(?:(?::|[ \t][-–—][ \t])[ \t]*" + _BOLD + r"[ \t]*(?P<text>[^\n]*))?\r?$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def _field(match):
+    label = match.group("label")
+    field = _FIELD_OF_LABEL.get(label)
+    if field is None:
+        # Spelling not seen yet (case, spacing): normalize it once and remember it
+        field = _FIELD_OF_LABEL[label] = _FIELD_OF_LABEL[_normalize_label(label)]
+    return field
+
+
+# Start of a field's text on its label line, without the closing bold marker
+def _label_text(match):
+    text = (match.group("text") or "").rstrip()
+    return text[:-2] if text.endswith(("**", "__")) else text
+
+
+# Function to join the label-line text of a field and its continuation lines
+def _join(first, rest):
+    first = first.strip()
+    rest = rest.strip()
+    if not rest:
+        return first
+    rest = " ".join(line.strip() for line in rest.splitlines() if line.strip())
+    return f"{first} {rest}" if first else rest
+
+
+# Function to parse a structured summary into its fields in one regex pass. The text of a
+# field runs from its label to the next label (continuation lines included); text before
+# the first label is ignored, and when a label repeats its first section is kept.
+# Missing fields are "N/A".
+def parse_sections(text):
+    parsed_data = dict.fromkeys(SECTION_FIELDS, MISSING)
+    found = set()
+    matches = list(_LABEL_LINE.finditer(text or ""))
+    for i, match in enumerate(matches):
+        field = _field(match)
+        if field in found:
+            continue
+        found.add(field)
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        value = _join(_label_text(match), text[match.end():end])
+        if value:
+            parsed_data[field] = value
+    return parsed_data
+
+
+# Function to tell whether a structured summary is complete: every field in `fields` has
+# its text, or a label repeats (the model starts the schema over, which parse_sections
+# would ignore anyway). Once true it stays true as the text grows, as long as only
+# complete lines are passed.
+def sections_complete(text, fields=SECTION_FIELDS):
+    found = set()
+    for match in _LABEL_LINE.finditer(text):
+        field = _field(match)
+        if field in found:
+            return True
+        found.add(field)
+    if not found.issuperset(fields):
+        return False
+    parsed_data = parse_sections(text)
+    return all(parsed_data[field] != MISSING for field in fields)
+
+
+# Incremental parser of a streamed structured summary: feed it the text chunks as they
+# arrive and it returns each field as soon as it is complete, i.e. when the next label
+# line starts (the last field is completed by close()). The result is the same as
+# parse_sections on the whole text.
+class SectionStream:
+    def __init__(self):
+        self.fields = dict.fromkeys(SECTION_FIELDS, MISSING)
+        self._found = set()
+        self._buffer = ""
+        self._current = None
+        self._parts = []
+
+    # Function to add a chunk of text; returns the (field, text) pairs completed by it
+    def feed(self, chunk):
+        self._buffer += chunk
+        completed = []
+        # Only whole lines can be classified: the rest waits for the next chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._line(line, completed)
+        return completed
+
+    # Function to end the stream; returns the fields completed by its end
+    def close(self):
+        completed = []
+        if self._buffer:
+            self._line(self._buffer, completed)
+            self._buffer = ""
+        self._finish(completed)
+        return completed
+
+    def _line(self, line, completed):
+        match = _LABEL_LINE.match(line)
+        if match is None:
+            if self._current is not None:
+                self._parts.append(line)
+            return
+        self._finish(completed)
+        field = _field(match)
+        # A repeated label is skipped along with its text, as in parse_sections
+        if field in self._found:
+            return
+        self._found.add(field)
+        self._current = field
+        self._parts = [_label_text(match)]
+
+    def _finish(self, completed):
+        if self._current is None:
+            return
+        value = _join(self._parts[0], "\n".join(self._parts[1:]))
+        if value:
+            self.fields[self._current] = value
+            completed.append((self._current, value))
+        self._current = None
+        self._parts = []
@@ -1,25 +1,41 @@
-import pandas as pd
-import spacy
-from collections import Counter
-import matplotlib.pyplot as plt
-from wordcloud import STOPWORDS
+import argparse
+from result_sink import read_results
+from token_cache import parse_texts
+from keyword_counts import count_keywords
 
-# Load the spaCy model for English
-nlp = spacy.load("en_core_web_sm")
-
-# Step 1: Load the CSV data
-df = pd.read_csv("sintese_estudos.csv")
+# Pipeline components never used for keyword extraction (only lemmas and POS tags are needed)
+UNUSED_COMPONENTS = ["parser", "ner"]
 
 # Define a list of additional stop words (common words we don't want in the keywords)
-custom_stop_words = STOPWORDS.union({
+extra_stop_words = {
     "the", "a", "an", "of", "and", "to", "in", "for", "on", "with", "this", "study", "paper", "research",
     "is", "are", "was", "were", "has", "have", "be", "by", "which", "that", "from", "as", "it", "also",
     "can", "may", "such", "these", "one", "two", "used", "using", "abstract", "synthesize", "problem", "context", "describe", "address"
-})
+}
 
-# Step 2: Function to extract keywords and remove stop words
-def extract_keywords(text):
-    doc = nlp(text)
+nlp = None
+custom_stop_words = None
+
+# Build the stop words (wordcloud's list plus ours) once, on first use, so --help never imports wordcloud
+def get_stop_words():
+    global custom_stop_words
+    if custom_stop_words is None:
+        from wordcloud import STOPWORDS
+        custom_stop_words = STOPWORDS.union(extra_stop_words)
+    return custom_stop_words
+
+# Load the spaCy model for English (once, on first use)
+def get_nlp():
+    global nlp
+    if nlp is None:
+        # Imported here so that runs served from the token cache never load spaCy
+        import spacy
+        nlp = spacy.load("en_core_web_sm", exclude=UNUSED_COMPONENTS)
+    return nlp
+
+# Step 2: Function to extract keywords and remove stop words (from a spaCy doc or cached tokens)
+def keywords_from_doc(doc):
+    custom_stop_words = get_stop_words()
     keywords = [
         token.lemma_.lower()
         for token in doc
@@ -30,35 +46,87 @@ def extract_keywords(text):
     ]
     return keywords
 
+def extract_keywords(text):
+    return keywords_from_doc(get_nlp()(text))
+
+# Fast mode: stream the texts through nlp.pipe in batches (and processes), yielding keyword lists in order
+def extract_keywords_pipe(texts, batch_size=256, n_process=1):
+    for doc in get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process):
+        yield keywords_from_doc(doc)
+
 # Step 3: Apply the keyword extraction function to the Objectives and Problems columns
-df["Objectives Keywords"] = df["objectives"].apply(lambda text: extract_keywords(str(text)))
-df["Problems Keywords"] = df["problem"].apply(lambda text: extract_keywords(str(text)))
-
-# Step 4: Flatten the lists and get frequency counts for top keywords in both columns
-objectives_keywords = [keyword for sublist in df["Objectives Keywords"] for keyword in sublist]
-problems_keywords = [keyword for sublist in df["Problems Keywords"] for keyword in sublist]
-
-# Step 5: Get the top 10 keywords
-top_objectives_keywords = Counter(objectives_keywords).most_common(10)
-top_problems_keywords = Counter(problems_keywords).most_common(10)
-
-# Step 6: Convert to DataFrame for easier plotting
-top_keywords_df = pd.DataFrame({
-    "Objectives Keywords": dict(top_objectives_keywords),
-    "Problems Keywords": dict(top_problems_keywords)
-})
-
-# Step 7: Create the plot
-top_keywords_df.plot(kind="bar", figsize=(10, 6), width=0.8)
-plt.title("Top 10 Keywords in Objectives and Problems")
-plt.ylabel("Frequency")
-plt.xlabel("Keywords")
-plt.xticks(rotation=45)
-plt.legend(loc="best")
-plt.tight_layout()
-
-# Step 8: Save the plot
-plt.savefig("filtered_keywords_top10.png")
-
-# Show the plot
-plt.show()
\ No newline at end of file
+def add_keyword_columns(df, fast=False, batch_size=256, n_process=1, use_token_cache=True):
+    objectives = [str(text) for text in df["objectives"]]
+    problems = [str(text) for text in df["problem"]]
+
+    if use_token_cache:
+        # Each text is parsed once and its tokens reused by later runs
+        docs = parse_texts(objectives + problems, get_nlp, batch_size=batch_size, n_process=n_process if fast else 1)
+        keywords = [keywords_from_doc(doc) for doc in docs]
+        df["Objectives Keywords"] = keywords[:len(objectives)]
+        df["Problems Keywords"] = keywords[len(objectives):]
+        return df
+
+    if not fast:
+        df["Objectives Keywords"] = df["objectives"].apply(lambda text: extract_keywords(str(text)))
+        df["Problems Keywords"] = df["problem"].apply(lambda text: extract_keywords(str(text)))
+        return df
+
+    # Both columns go through a single pipe, so the worker processes are started only once
+    keywords = list(extract_keywords_pipe(objectives + problems, batch_size, n_process))
+    df["Objectives Keywords"] = keywords[:len(objectives)]
+    df["Problems Keywords"] = keywords[len(objectives):]
+    return df
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plot the top keywords of the objectives and problems.")
+    parser.add_argument("--input", default="sintese_estudos.csv", help="Synthesis table (CSV or Parquet)")
+    parser.add_argument("--fast", action="store_true", help="Stream the columns through nlp.pipe instead of one nlp() call per cell")
+    parser.add_argument("--batch-size", type=int, default=256, help="Texts per nlp.pipe batch in fast mode")
+    parser.add_argument("--n-process", type=int, default=-1, help="Worker processes in fast mode (-1 = all cores)")
+    parser.add_argument("--no-token-cache", action="store_true", help="Parse every cell again instead of reading the token cache")
+    args = parser.parse_args(argv)
+
+    # Imported only for an actual run, so --help starts quickly
+    import pandas as pd
+    import matplotlib.pyplot as plt
+
+    # Step 1: Load the CSV data
+    df = read_results(args.input, columns=["objectives", "problem"])
+
+    df = add_keyword_columns(df, fast=args.fast, batch_size=args.batch_size, n_process=args.n_process,
+                             use_token_cache=not args.no_token_cache)
+
+    # Step 4: Count the keywords of both columns in one sparse document-term matrix
+    counts = count_keywords({
+        "objectives": list(df["Objectives Keywords"]),
+        "problem": list(df["Problems Keywords"])
+    })
+
+    # Step 5: Get the top 10 keywords
+    top_objectives_keywords = counts.top_keywords("objectives", 10)
+    top_problems_keywords = counts.top_keywords("problem", 10)
+
+    # Step 6: Convert to DataFrame for easier plotting
+    top_keywords_df = pd.DataFrame({
+        "Objectives Keywords": dict(top_objectives_keywords),
+        "Problems Keywords": dict(top_problems_keywords)
+    })
+
+    # Step 7: Create the plot
+    top_keywords_df.plot(kind="bar", figsize=(10, 6), width=0.8)
+    plt.title("Top 10 Keywords in Objectives and Problems")
+    plt.ylabel("Frequency")
+    plt.xlabel("Keywords")
+    plt.xticks(rotation=45)
+    plt.legend(loc="best")
+    plt.tight_layout()
+
+    # Step 8: Save the plot
+    plt.savefig("filtered_keywords_top10.png")
+
+    # Show the plot
+    plt.show()
+
+if __name__ == "__main__":
+    main()
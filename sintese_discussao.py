@@ -1,38 +1,69 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from collections import Counter
-import spacy
-from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS as sklearn_stopwords
+import argparse
 import string
+from result_sink import read_results
+from token_cache import parse_texts
+from keyword_counts import count_keywords
 
-# Carregar modelo Spacy
-nlp = spacy.load("en_core_web_sm")
+nlp = None
+stopwords = None
+
+# Carregar modelo Spacy (somente quando há textos que ainda não estão no cache de tokens)
+def get_nlp():
+    global nlp
+    if nlp is None:
+        import spacy
+        nlp = spacy.load("en_core_web_sm")
+    return nlp
+
+custom_stopwords = {'study', 'datum', 'apply', 'use', 'technique', 'result', 'findings', 'based', '%', 'abstract', 'problem'}  # Stopwords customizadas
+
+# Stopwords do sklearn + customizadas, montadas uma única vez no primeiro uso (as do Spacy vêm de token.is_stop);
+# o sklearn é importado aqui para que o --help não precise carregá-lo
+def get_stopwords():
+    global stopwords
+    if stopwords is None:
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS as sklearn_stopwords
+        stopwords = frozenset(sklearn_stopwords) | custom_stopwords
+    return stopwords
+
+# Função para remover stopwords, pontuação e termos irrelevantes de uma lista de tokens
+def clean_tokens(tokens):
+    stopwords = get_stopwords()
+    return [token.lemma_ for token in tokens if token.text not in string.punctuation and
+            not token.is_stop and token.text not in stopwords and not token.is_digit and len(token.text) > 2]
 
 # Função para remover stopwords, pontuação e termos irrelevantes
 def clean_text(text):
-    doc = nlp(text.lower())
-    stopwords = nlp.Defaults.stop_words | sklearn_stopwords  # Usar stopwords do Spacy + sklearn
-    custom_stopwords = {'study', 'datum', 'apply', 'use', 'technique', 'result', 'findings', 'based', '%', 'abstract', 'problem'}  # Stopwords customizadas
-    stopwords |= custom_stopwords
-    
-    tokens = [token.lemma_ for token in doc if token.text not in string.punctuation and 
-              token.text not in stopwords and not token.is_digit and len(token.text) > 2]
-    return tokens
+    return clean_tokens(parse_texts([text.lower()], get_nlp)[0])
+
+# Função para contar as palavras-chave de várias colunas de uma só vez (matriz esparsa documento-termo)
+def count_column_keywords(df, columns, ngram_range=(1, 1)):
+    # Todas as colunas são analisadas juntas; textos já vistos vêm do cache de tokens
+    texts = {column: [text.lower() for text in df[column].dropna()] for column in columns}
+    docs = parse_texts([text for column in columns for text in texts[column]], get_nlp)
+    documents = {}
+    start = 0
+    for column in columns:
+        end = start + len(texts[column])
+        documents[column] = [clean_tokens(tokens) for tokens in docs[start:end]]
+        start = end
+    return count_keywords(documents, ngram_range)
 
 # Função para contar as palavras mais frequentes
 def get_top_keywords(column_data, top_n=10):
-    all_tokens = []
-    for text in column_data.dropna():
-        all_tokens.extend(clean_text(text))
-    return Counter(all_tokens).most_common(top_n)
+    counts = count_column_keywords(column_data.to_frame('column'), ['column'])
+    return counts.top_keywords('column', top_n)
 
 # Função para gerar os gráficos de palavras-chave
 def plot_top_keywords(df, top_n=10):
+    import matplotlib.pyplot as plt
+    counts = count_column_keywords(df, ['Methods_Techniques', 'Results'])
+
     # Palavras mais frequentes em Methods
-    top_methods = get_top_keywords(df['Methods_Techniques'], top_n)
+    top_methods = counts.top_keywords('Methods_Techniques', top_n)
     
     # Palavras mais frequentes em Results
-    top_results = get_top_keywords(df['Results'], top_n)
+    top_results = counts.top_keywords('Results', top_n)
     
     # Criar o gráfico
     fig, axs = plt.subplots(1, 2, figsize=(14, 6))
@@ -55,9 +86,13 @@ def plot_top_keywords(df, top_n=10):
     plt.show()
 
 # Função principal para carregar e executar o código
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gerar os gráficos das palavras-chave de métodos e resultados.")
+    parser.add_argument("--input", default="sintese_estudos.csv", help="Tabela de síntese (CSV ou Parquet)")
+    args = parser.parse_args(argv)
+
     # Carregar o CSV (ajuste o caminho do arquivo se necessário)
-    df = pd.read_csv('sintese_estudos.csv')
+    df = read_results(args.input, columns=['Methods_Techniques', 'Results'])
     
     # Gerar os gráficos para os top 10 métodos e resultados
     plot_top_keywords(df, top_n=10)
@@ -1,15 +1,21 @@
-import openai
-import pandas as pd
+import argparse
 from collections import Counter
-import matplotlib.pyplot as plt
-import time
-import config
-
-# Configurar sua chave API da OpenAI
-openai.api_key = config.OPENAI_KEY
-
-# Função para enviar um prompt à API do OpenAI para analisar e correlacionar problemas, métodos e resultados
-def analyze_problems_methods_results(texts):
+from batching import pack_by_tokens
+from metrics import add_metrics_arguments, configure_metrics
+from rate_limiter import RateLimiter
+from result_sink import read_results
+from synthesis import DEFAULT_FAN_IN, DEFAULT_INPUT_TOKENS, ChatSynthesis
+
+# Modelo, parâmetros e janela de contexto (tokens de entrada + saída) das chamadas
+MODEL_NAME = "gpt-4-turbo"
+PARAMS = {"max_tokens": 1000, "temperature": 0.7}  # Reduzir o número de tokens por lote
+CONTEXT_WINDOW = 128000
+
+# Limite de requisições e tokens por minuto (substitui a pausa fixa de 2 segundos por requisição)
+limiter = RateLimiter(requests_per_minute=30, tokens_per_minute=30000)
+
+# Função para montar as mensagens do pedido de análise de um lote de textos
+def build_messages(texts):
     prompt = f"""Analyze the following problems, methods, and results from the studies.
     Your task is to:
     1. Identify the key problems being addressed.
@@ -19,41 +25,39 @@ def analyze_problems_methods_results(texts):
     
     Problems, Methods, Results:\n\n{texts}"""
 
-    response = openai.chat.completions.create(
-        model="gpt-4-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=1000,  # Reduzir o número de tokens por lote
-        temperature=0.7
-    )
-
-    # Correção para acessar corretamente o conteúdo da resposta
-    summary_text = response.choices[0].message.content
-    return summary_text
-
-# Função para processar os dados em lotes menores
-def process_with_chatgpt(df, batch_size=2):
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+# Chamadas à API (com limite de taxa e cache de respostas), orçamento de tokens e map-reduce (veja synthesis.py)
+synthesizer = ChatSynthesis(MODEL_NAME, PARAMS, build_messages, limiter, CONTEXT_WINDOW)
+
+# Função para enviar um prompt à API do OpenAI para analisar e correlacionar problemas, métodos e resultados
+def analyze_problems_methods_results(texts):
+    return synthesizer.request(build_messages(texts))
+
+# Função para processar os dados em lotes menores. Com `pack`, os lotes não têm tamanho
+# fixo: as linhas são empacotadas, em ordem, até o orçamento de tokens de entrada
+# (linhas maiores que o orçamento são divididas em partes). Com `map_reduce`, os lotes
+# são analisados em paralelo e as análises consolidadas em uma só (veja synthesis.py)
+def process_with_chatgpt(df, batch_size=2, pack=False, max_input_tokens=None, map_reduce=False,
+                         fan_in=DEFAULT_FAN_IN, workers=4):
     # Coletar apenas as colunas 'Problem', 'Methods_Techniques' e 'Results'
     selected_columns = df[['Problem', 'Methods_Techniques', 'Results']].dropna()
-    results = []
-
-    # Dividir em lotes e enviar para o GPT-4
-    for i in range(0, len(selected_columns), batch_size):
-        batch_df = selected_columns.iloc[i:i + batch_size]
-        batch_texts = batch_df.to_string(index=False, header=False)
-        
-        try:
-            analysis = analyze_problems_methods_results(batch_texts)
-            results.append(analysis)
-            # Aguardar um pouco para evitar limite de taxa
-            time.sleep(2)  # Esperar 2 segundos entre cada requisição para evitar problemas de limite
-        except openai.error.RateLimitError as e:
-            print(f"Rate limit exceeded for batch {i // batch_size + 1}, skipping...")
-            continue  # Ignorar erros de limite de taxa e continuar com o próximo lote
-
-    return "\n".join(results)
+
+    # Dividir em lotes
+    if pack:
+        rows = [" ".join(str(value) for value in row) for row in selected_columns.itertuples(index=False)]
+        budget = synthesizer.text_token_budget(max_input_tokens)
+        batches = ["\n".join(batch) for batch in pack_by_tokens(rows, budget, synthesizer.count_tokens)]
+    else:
+        batches = [selected_columns.iloc[i:i + batch_size].to_string(index=False, header=False)
+                   for i in range(0, len(selected_columns), batch_size)]
+    print(f"{len(selected_columns)} linhas em {len(batches)} chamadas à API")
+
+    # Enviar os lotes para o GPT-4, um após o outro ou em map-reduce
+    return synthesizer.run(batches, map_reduce, fan_in, workers)
 
 # Função para exibir a análise de forma organizada
 def display_analysis(analysis_text):
@@ -62,6 +66,7 @@ def display_analysis(analysis_text):
 
 # Função para gerar gráficos com base nos termos mais comuns
 def plot_keywords(counter_data, title):
+    import matplotlib.pyplot as plt
     keywords, counts = zip(*counter_data.most_common(10))
     plt.barh(keywords, counts, color='skyblue')
     plt.title(title)
@@ -87,12 +92,30 @@ def keyword_count_by_section(analysis_text, section):
     section_words = " ".join(section_text).split()
     return Counter(section_words)
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sintetizar problemas, métodos e resultados extraídos com o GPT-4-turbo.")
+    parser.add_argument("--input", default="/mnt/data/processed_abstracts.csv", help="Resultados da extração (CSV ou Parquet)")
+    parser.add_argument("--batch-size", type=int, default=2, help="Linhas por chamada à API (sem --pack)")
+    parser.add_argument("--pack", action="store_true",
+                        help="Empacotar em cada chamada tantas linhas quantas couberem no orçamento de tokens de entrada")
+    parser.add_argument("--max-input-tokens", type=int,
+                        help=f"Orçamento de tokens de entrada por chamada com --pack (padrão: {DEFAULT_INPUT_TOKENS})")
+    parser.add_argument("--map-reduce", action="store_true",
+                        help="Analisar os lotes em paralelo e consolidar as análises em árvore, em vez de concatená-las")
+    parser.add_argument("--fan-in", type=int, default=DEFAULT_FAN_IN, help="Análises consolidadas por chamada com --map-reduce")
+    parser.add_argument("--workers", type=int, default=4, help="Chamadas simultâneas à API com --map-reduce")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = configure_metrics(args, "sintesegpt")
+
     # Carregar os dados
-    df = pd.read_csv('/mnt/data/processed_abstracts.csv')
+    # Ler apenas as colunas usadas na análise (CSV ou Parquet)
+    df = read_results(args.input, columns=['Problem', 'Methods_Techniques', 'Results'])
 
     # Processar os abstracts com ChatGPT para obter a análise de problemas, métodos e resultados
-    analysis_text = process_with_chatgpt(df)
+    analysis_text = process_with_chatgpt(df, args.batch_size, args.pack, args.max_input_tokens,
+                                         args.map_reduce, args.fan_in, args.workers)
+    metrics.close()
 
     # Exibir a análise completa (para revisão)
     display_analysis(analysis_text)
@@ -0,0 +1,45 @@
+import abc
+import re
+from section_parser import SECTION_FIELDS, sections_complete
+
+# End of the first sentence of an answer: a sentence mark followed by whitespace (so that
+# a decimal point or "e.g." does not end it), or a line break after some text
+_SENTENCE_DONE = re.compile(r"\S.*?(?:(?<!\be\.g)(?<!\bi\.e)(?<!\bet al)[.!?]\s|\n)", re.DOTALL)
+
+
+# Stopping criteria for greedy model.generate() calls that end a sequence once its
+# generated text is complete, instead of decoding up to max_new_tokens. They are called
+# like a transformers StoppingCriteria, with the ids generated so far, and return one flag
+# per sequence. Beam search only stops once every beam is done, so they are not meant for
+# it. The text after the first `prompt_length` ids (the echoed prompt) is decoded again on
+# every step, since assisted decoding can add several tokens in one step.
+class TextStoppingCriteria(abc.ABC):
+    def __init__(self, tokenizer, prompt_length=0):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+
+    @abc.abstractmethod
+    def is_complete(self, text):
+        pass
+
+    def __call__(self, input_ids, scores=None, **kwargs):
+        import torch
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        return torch.tensor([self.is_complete(text) for text in texts], dtype=torch.bool, device=input_ids.device)
+
+
+# Stop a structured summary once all its sections have their text (see sections_complete).
+# Only complete lines are checked, so the last section is not cut in the middle of its line.
+class SectionStoppingCriteria(TextStoppingCriteria):
+    def __init__(self, tokenizer, prompt_length=0, fields=SECTION_FIELDS):
+        super().__init__(tokenizer, prompt_length)
+        self.fields = fields
+
+    def is_complete(self, text):
+        return sections_complete(text[:text.rfind("\n") + 1], self.fields)
+
+
+# Stop a one-sentence answer (the problem of a study) at the end of its first sentence
+class SentenceStoppingCriteria(TextStoppingCriteria):
+    def is_complete(self, text):
+        return _SENTENCE_DONE.search(text) is not None
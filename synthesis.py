@@ -0,0 +1,168 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from llm_cache import endpoint_backend, get_cache
+from metrics import get_metrics
+from rate_limiter import count_tokens
+
+# Largest number of partial results merged by one reduce call
+DEFAULT_FAN_IN = 4
+# Default input-token budget of one call with --pack: moderate batches, instead of filling
+# the context window (and the tokens-per-minute limit) with a single call
+DEFAULT_INPUT_TOKENS = 8000
+# Backend name in the response cache (separate for a custom OPENAI_BASE_URL)
+CACHE_BACKEND = endpoint_backend("openai", os.environ.get("OPENAI_BASE_URL"))
+
+
+# Set up the OpenAI API key (on first use, so importing a script does not require config.py).
+# OPENAI_API_KEY and OPENAI_BASE_URL, when set, take precedence (e.g. to target a local mock server).
+def configure_openai():
+    import openai
+    if openai.api_key is None:
+        if os.environ.get("OPENAI_API_KEY"):
+            openai.api_key = os.environ["OPENAI_API_KEY"]
+        else:
+            import config
+            openai.api_key = config.OPENAI_KEY
+
+
+# Function to build the messages of a request that merges partial analyses (reduce step)
+def build_merge_messages(analyses):
+    parts = "\n\n---\n\n".join(analyses)
+    prompt = f"""Merge the following partial analyses of scientific studies into one consolidated analysis.
+    Your task is to:
+    1. Combine the key problems, merging duplicates and near-duplicates.
+    2. Combine the methods or techniques used to address those problems.
+    3. Combine the main results or findings.
+    Keep a single mapping of problems to methods and their respective results, with the sections Problems, Methods and Results.
+
+    Partial analyses:\n\n{parts}"""
+
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+# Function to group the partial results of one tree level, in input order. Appending new
+# inputs therefore only changes the last group of each level, so with a content-addressed
+# response cache just that branch of the tree is recomputed.
+def reduce_groups(parts, fan_in=DEFAULT_FAN_IN):
+    return [parts[i:i + fan_in] for i in range(0, len(parts), fan_in)]
+
+
+# Function to run a map-reduce synthesis: `map_function` analyzes every batch concurrently,
+# then `reduce_function` merges the partial results in a tree with at most `fan_in`
+# children per node until one result remains. Both functions may return None on failure.
+# A failed batch keeps its place in the tree (so the groups of the other branches, and
+# their cached merges, do not move) and is left out when its group is merged; a failed
+# merge keeps its inputs concatenated.
+def map_reduce(batches, map_function, reduce_function, fan_in=DEFAULT_FAN_IN, max_workers=4):
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2")
+
+    def reduce_group(group):
+        parts = [part for part in group if part]
+        if len(parts) <= 1:
+            return parts[0] if parts else None
+        return reduce_function(parts) or "\n".join(parts)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        level = list(executor.map(map_function, batches))
+        depth = 0
+        while len(level) > 1:
+            depth += 1
+            groups = reduce_groups(level, fan_in)
+            print(f"Reduce level {depth}: merging {len(level)} partial results in {len(groups)} calls")
+            level = list(executor.map(reduce_group, groups))
+    return (level[0] if level else None) or ""
+
+
+# GPT-4-turbo synthesis of the batches of a script: its model, request parameters, analysis
+# prompt (`build_messages(texts)`) and rate limiter. Requests are rate limited and cached;
+# identical requests are read from the response cache without calling the API.
+class ChatSynthesis:
+    def __init__(self, model, params, build_messages, limiter=None, context_window=128000):
+        self.model = model
+        self.params = params
+        self.build_messages = build_messages
+        self.limiter = limiter
+        self.context_window = context_window
+
+    # Function to count the tokens of a text with the model's tokenizer
+    def count_tokens(self, text):
+        return count_tokens(text, self.model)
+
+    # Function to compute how many text tokens fit in one call: the requested input budget
+    # (or the default), within the context window minus the longest answer and within the
+    # tokens-per-minute limit (input + answer), less the fixed prompt
+    def text_token_budget(self, max_input_tokens=None):
+        overhead = sum(self.count_tokens(message["content"]) + 4 for message in self.build_messages(""))
+        budget = min(max_input_tokens or DEFAULT_INPUT_TOKENS, self.context_window - self.params["max_tokens"])
+        limit = self.limiter.max_request_tokens() if self.limiter else None
+        if limit:
+            budget = min(budget, limit - self.params["max_tokens"])
+        return budget - overhead
+
+    # Function to send the messages to the OpenAI API
+    def request(self, messages):
+        def request_analysis():
+            import openai
+            configure_openai()
+            metrics = get_metrics()
+            # Wait for the rate limit (only for real API calls)
+            estimated_tokens = sum(self.count_tokens(message["content"]) for message in messages) + self.params["max_tokens"]
+            if self.limiter is not None:
+                with metrics.stage("rate_limit"):
+                    self.limiter.wait(estimated_tokens)
+            with metrics.stage("request"):
+                response = openai.chat.completions.create(model=self.model, messages=messages, **self.params)
+            if response.usage is not None:
+                metrics.count("tokens_in", response.usage.prompt_tokens)
+                metrics.count("tokens_out", response.usage.completion_tokens)
+                if self.limiter is not None:
+                    self.limiter.record_usage(estimated_tokens, response.usage.total_tokens)
+            return response.choices[0].message.content
+
+        return get_cache().cached(CACHE_BACKEND, self.model, messages, self.params, request_analysis)
+
+    # Function to analyze one batch (map step); returns None if the batch fails: an API
+    # error, or a request larger than the limiter's tokens-per-minute capacity (ValueError)
+    def analyze_batch(self, i, texts):
+        import openai
+        metrics = get_metrics()
+        try:
+            return self.request(self.build_messages(texts))
+        except openai.RateLimitError:
+            print(f"Rate limit exceeded for batch {i + 1}, skipping...")
+            metrics.count("errors")
+            return None  # Skip the batch and go on with the next one
+        except (openai.APIError, ValueError) as e:
+            print(f"Error in batch {i + 1}, skipping: {e}")
+            metrics.count("errors")
+            return None
+        finally:
+            metrics.item_done()
+
+    # Function to merge a group of analyses into one (reduce step); returns None if it fails
+    def merge_group(self, analyses):
+        import openai
+        try:
+            return self.request(build_merge_messages(analyses))
+        except openai.RateLimitError:
+            print(f"Rate limit exceeded while merging {len(analyses)} analyses, keeping them separate...")
+            get_metrics().count("errors")
+            return None
+        except (openai.APIError, ValueError) as e:
+            print(f"Error while merging {len(analyses)} analyses, keeping them separate: {e}")
+            get_metrics().count("errors")
+            return None
+
+    # Function to analyze the batches: one after the other, with the analyses concatenated,
+    # or with `tree` concurrently (`workers` calls at a time) and merged in a map-reduce tree
+    def run(self, batches, tree=False, fan_in=DEFAULT_FAN_IN, workers=4):
+        get_metrics().set_total(len(batches))
+        if tree:
+            return map_reduce(list(enumerate(batches)), lambda item: self.analyze_batch(*item), self.merge_group,
+                              fan_in=fan_in, max_workers=workers)
+        analyses = (self.analyze_batch(i, texts) for i, texts in enumerate(batches))
+        return "\n".join(analysis for analysis in analyses if analysis is not None)
@@ -0,0 +1,20 @@
+from dedup import NearDuplicateIndex, find_near_duplicates, shingle_hashes
+
+
+def test_texts_without_words_have_no_shingles():
+    assert len(shingle_hashes("")) == 0
+    assert len(shingle_hashes("... -- !!")) == 0
+
+
+def test_texts_without_words_are_never_duplicates():
+    index = NearDuplicateIndex()
+    assert index.add("") == (0, False)
+    assert index.add("?!") == (1, False)
+    assert index.add("... --") == (2, False)
+
+
+def test_near_duplicates_are_still_found_around_word_less_texts():
+    text = "We propose a method for the extraction of structured fields from scientific abstracts."
+    representatives, duplicates = find_near_duplicates(["", text, "?!", text + " "])
+    assert representatives == ["", text, "?!"]
+    assert duplicates == {text: [text + " "]}
@@ -1,20 +1,36 @@
 import openai
 import asyncio
-import config
+import os
+from rate_limiter import RateLimiter
 
-# Set up the OpenAI API key
-openai.api_key = config.OPENAI_KEY
+# OPENAI_API_KEY and OPENAI_BASE_URL, when set, take precedence (e.g. to target a local mock server)
+if os.environ.get("OPENAI_API_KEY"):
+    api_key = os.environ["OPENAI_API_KEY"]
+else:
+    import config
+    api_key = config.OPENAI_KEY
+
+# Async client: the module-level openai.chat.completions is synchronous and cannot be awaited
+client = openai.AsyncOpenAI(api_key=api_key)
+
+# Shared limiter for all the concurrent calls
+limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=30000)
 
 # Use an async function for the API call
 async def get_abstract_analysis(abstract_text):
-    response = await openai.chat.completions.create(  # note 'acreate' for async
+    await limiter.acquire()
+    response = await client.chat.completions.create(
         model="gpt-4",  # or "gpt-3.5-turbo"
         messages=[
             {"role": "system", "content": "You are an expert summarizer."},
             {"role": "user", "content": f"Extract the following fields from this abstract:\n\nAbstract: {abstract_text}\n\n1. Objectives\n2. Problem\n3. Data\n4. Methods and Techniques\n5. Results"}
         ]
     )
-    return response['choices'][0]['message']['content']
+    return response.choices[0].message.content
+
+# Analyze several abstracts concurrently, keeping the input order
+async def get_abstract_analyses(abstract_texts):
+    return await asyncio.gather(*(get_abstract_analysis(text) for text in abstract_texts))
 
 # Run the async function in the main event loop
 if __name__ == "__main__":
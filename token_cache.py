@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import sqlite3
+from collections import namedtuple
+from importlib import metadata
+
+# Where the parsed tokens of the synthesis tables are stored
+DEFAULT_TOKEN_CACHE_PATH = os.environ.get("ABSTRACT_TOKEN_CACHE_PATH", ".token_cache.sqlite")
+# SQLite limits the number of parameters of one query
+_LOOKUP_CHUNK = 500
+
+# Token attributes kept from spaCy; the names match spaCy's Token so the same
+# filtering code works on cached tokens and on live spaCy documents
+Token = namedtuple("Token", ["text", "lemma_", "pos_", "is_stop", "is_punct", "is_digit"])
+
+
+# Function to identify the spaCy model (name and installed version) in the cache keys
+def model_signature(model_name):
+    try:
+        return f"{model_name}=={metadata.version(model_name)}"
+    except metadata.PackageNotFoundError:
+        return model_name
+
+
+def _key(signature, text):
+    return hashlib.sha256(f"{signature}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _encode(doc):
+    return json.dumps([
+        [token.text for token in doc],
+        [token.lemma_ for token in doc],
+        [token.pos_ for token in doc],
+        [int(token.is_stop) for token in doc],
+        [int(token.is_punct) for token in doc],
+        [int(token.is_digit) for token in doc],
+    ], ensure_ascii=False)
+
+
+def _decode(value):
+    texts, lemmas, tags, stops, puncts, digits = json.loads(value)
+    return [
+        Token(text, lemma, pos, bool(stop), bool(punct), bool(digit))
+        for text, lemma, pos, stop, punct, digit in zip(texts, lemmas, tags, stops, puncts, digits)
+    ]
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS docs (key TEXT PRIMARY KEY, tokens TEXT NOT NULL)")
+    return conn
+
+
+# Function to parse texts into token lists, reusing the on-disk cache.
+# Only texts that are not cached yet are sent through `load_nlp()` (called at most
+# once, so spaCy is not even imported when everything is cached). Returns one token
+# list per text, in input order.
+def parse_texts(texts, load_nlp, model_name="en_core_web_sm", batch_size=256, n_process=1,
+                path=DEFAULT_TOKEN_CACHE_PATH):
+    signature = model_signature(model_name)
+    keys = [_key(signature, text) for text in texts]
+    parsed = {}
+    conn = _connect(path)
+    try:
+        unique_keys = list(dict.fromkeys(keys))
+        for i in range(0, len(unique_keys), _LOOKUP_CHUNK):
+            chunk = unique_keys[i:i + _LOOKUP_CHUNK]
+            query = f"SELECT key, tokens FROM docs WHERE key IN ({','.join('?' * len(chunk))})"
+            for key, value in conn.execute(query, chunk):
+                parsed[key] = _decode(value)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in parsed}
+        if missing:
+            print(f"Token cache: parsing {len(missing)} of {len(texts)} texts with spaCy.")
+            nlp = load_nlp()
+            rows = []
+            for key, doc in zip(missing, nlp.pipe(missing.values(), batch_size=batch_size, n_process=n_process)):
+                value = _encode(doc)
+                rows.append((key, value))
+                parsed[key] = _decode(value)
+            conn.executemany("INSERT OR REPLACE INTO docs (key, tokens) VALUES (?, ?)", rows)
+            conn.commit()
+    finally:
+        conn.close()
+
+    return [parsed[key] for key in keys]
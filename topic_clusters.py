@@ -0,0 +1,49 @@
+import math
+import numpy as np
+
+# Terms kept to describe each cluster
+TOP_TERMS = 8
+
+
+# Function to pick a number of topics for a corpus when none is given (about sqrt(n/2))
+def default_cluster_count(count):
+    return max(1, min(count, round(math.sqrt(count / 2))))
+
+
+# Function to group abstracts by topic: TF-IDF vectors (L2-normalized, so k-means
+# follows cosine similarity) clustered with MiniBatch k-means. Returns one dict per
+# cluster, largest first, with its top `terms`, its `size` and its `abstracts` ordered
+# from the most to the least central (closest to the centroid). With `top_k`, only the
+# `top_k` most central abstracts of each cluster are kept. The seed makes the clusters,
+# and so the synthesis prompts and their cache keys, the same on every run.
+def cluster_abstracts(abstracts, n_clusters=None, top_k=None, seed=0):
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    abstracts = list(abstracts)
+    if not abstracts:
+        return []
+    n_clusters = min(n_clusters or default_cluster_count(len(abstracts)), len(abstracts))
+
+    vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True, max_df=0.9 if len(abstracts) > 10 else 1.0)
+    vectors = vectorizer.fit_transform(abstracts)
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, batch_size=1024, n_init=3)
+    labels = model.fit_predict(vectors)
+    vocabulary = vectorizer.get_feature_names_out()
+
+    clusters = []
+    for label in range(n_clusters):
+        members = np.flatnonzero(labels == label)
+        if not len(members):
+            continue
+        centroid = model.cluster_centers_[label]
+        # The vectors have unit length, so the closest members have the largest dot product
+        members = members[np.argsort(-(vectors[members] @ centroid), kind="stable")]
+        terms = [vocabulary[j] for j in centroid.argsort()[::-1][:TOP_TERMS]]
+        clusters.append({
+            "terms": terms,
+            "size": len(members),
+            "abstracts": [abstracts[i] for i in members[:top_k]],
+        })
+    clusters.sort(key=lambda cluster: cluster["size"], reverse=True)
+    return clusters